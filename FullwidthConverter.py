@@ -1,11 +1,11 @@
 import os
-import traceback
+import re
 from argparse import RawTextHelpFormatter
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 from utils.argparser import MyParser
-from utils.logfile import _print, setLogfile, closeLogfile, print
+from utils.logfile import _print, setLogfile, closeLogfile, setLevel, logEnabled, print, verbose, LEVELS
 from utils.misc import mkFilepath
 
 VER = 'v1.0.4_halfwidth-sp'
@@ -45,22 +45,60 @@ def initparser():
     parser.add_argument('-o', '--output', metavar='OUTFILE', type=str, help='输出文件名，默认为<输入文件名>_out.txt。')
     parser.add_argument('-q', '--quit', action='store_true', help='结束后不暂停程序直接退出，方便命令行调用。不加该参数程序结束时会暂停。')
     parser.add_argument('--log', action='store_true', help='记录日志，执行结果输出到<输入文件名>_log.txt')
+    parser.add_argument('--loglevel', choices=list(LEVELS), default='verbose', help='控制台输出级别：quiet只输出错误，summary只输出统计信息，verbose输出逐行记录（默认）。日志文件总是记录全部内容。')
+    parser.add_argument('--bulk', action='store_true', help='大文件模式，按块读取并多进程并行转换。不需要逐行记录时请同时使用--loglevel summary。')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='大文件模式的最大并行进程数，默认为CPU核数。')
     return parser
 
-def convertline(line: str, lookup: dict):
+class LookupConverter:
+    """
+    预编译查找表，一次扫描完成转换。
+    多字符的键（带浊音、半浊音的假名）用一个最长优先的正则替换，单字符的键用str.translate；
+    不含任何键的行直接返回。
+    对于值中不含任何键的查找表（如lookup），结果与按顺序逐个str.replace完全一致。
+    """
+    def __init__(self, lookup: dict[str, str]):
+        self.lookup = lookup
+        self.table = str.maketrans({old: new for old, new in lookup.items() if len(old) == 1})
+        self.multi = {old: new for old, new in lookup.items() if len(old) > 1}
+        # 任一键的首字符，用于快速跳过无需转换的行
+        self.pat_any = re.compile('[' + ''.join(sorted({re.escape(old[0]) for old in lookup})) + ']') if lookup else None
+        self.pat_multi = None
+        if self.multi:
+            keys = sorted(self.multi, key=len, reverse=True)
+            self.pat_multi = re.compile('|'.join(map(re.escape, keys)))
+            # 多字符的键的其余字符（浊音、半浊音符号），不含这些字符的行跳过正则替换
+            self.multi_tails = ''.join(sorted({c for old in self.multi for c in old[1:]}))
+
+    def convert(self, line: str) -> str:
+        if self.pat_any is None or not self.pat_any.search(line):
+            return line
+        if self.pat_multi is not None and any(c in line for c in self.multi_tails):
+            line = self.pat_multi.sub(lambda m: self.multi[m[0]], line)
+        return line.translate(self.table)
+
+
+def compileLookup(lookup: Union[dict, LookupConverter]) -> LookupConverter:
+    return lookup if isinstance(lookup, LookupConverter) else LookupConverter(lookup)
+
+
+def convertline(line: str, lookup: Union[dict, LookupConverter]):
     # 日字的数字、全角空格、全角标点符号不能改，可能还是改回查找表，并且额外增加浊音半浊音
-    # 不能用str.translate，因为带浊音的假名是两个字符
+    # 带浊音的假名是两个字符，因此先替换多字符的键再用str.translate，见LookupConverter
     # line = unicodedata.normalize('NFKC', line)
-    for old, new in lookup.items():
-        line = line.replace(old, new)
-    return line
+    # 逐行调用时应传入预编译的LookupConverter，避免每次重新编译
+    return compileLookup(lookup).convert(line)
+
+ENCODINGS = ['utf-8-sig', 'gbk']
+"""依次尝试的输入文件编码，输出使用相同的编码"""
 
 def doconvert(inpath, outpath: Union[str, Path], lookup):
+    lookup = compileLookup(lookup)
+    log = logEnabled()
     cnter = 0
-    encodings = ['utf-8-sig', 'gbk']
     infile = None
     outfile = None
-    for encoding in encodings:
+    for encoding in ENCODINGS:
         try:
             infile = open(inpath, 'r', encoding=encoding)
             outfile = open(outpath, 'w', encoding=encoding)
@@ -68,8 +106,9 @@ def doconvert(inpath, outpath: Union[str, Path], lookup):
                 nline = convertline(line, lookup)
                 if nline != line:
                     cnter += 1
-                    print(line.rstrip('\n'), '->\n\t', nline.rstrip('\n'))
-                    print()
+                    if log:
+                        verbose(line.rstrip('\n'), '->\n\t', nline.rstrip('\n'))
+                        verbose()
                 outfile.write(nline)
             print('\n完成! 共转换了', cnter, '行，已保存至', str(outpath))
             return True
@@ -77,6 +116,7 @@ def doconvert(inpath, outpath: Union[str, Path], lookup):
             continue
         except Exception as err:
             print('\n发生了未知错误！请将下面的报错信息及待转换文件提交到 https://github.com/barryZZJ/SubtitleCleaner/issues\n')
+            import traceback
             traceback.print_exc()
             return False
         finally:
@@ -88,9 +128,145 @@ def doconvert(inpath, outpath: Union[str, Path], lookup):
     print('\n错误！无法识别的文件编码，请将文件转存为UTF8或GBK编码格式再试！')
     return False
 
+
+BULK_CHUNK = 8 << 20
+"""大文件模式每块的字节数"""
+
+BULK_SAMPLE = 1 << 16
+"""大文件模式检测编码时读取的字节数"""
+
+_WORKER_LOOKUP: Optional[LookupConverter] = None
+"""大文件模式子进程中编译好的查找表"""
+
+
+def _initWorker(lookup: dict):
+    global _WORKER_LOOKUP
+    _WORKER_LOOKUP = LookupConverter(lookup)
+
+
+def detectEncoding(sample: bytes) -> Optional[str]:
+    """
+    按ENCODINGS的顺序返回第一个能解码sample的编码，末尾被截断的多字节字符不算错误
+    :returns: None if no encoding fits
+    """
+    import codecs
+    for encoding in ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return None
+
+
+def splitLines(data, size: int) -> list[tuple[int, int]]:
+    """
+    把data（bytes或mmap）切分为约size字节、在换行符之后结束的若干块。
+    utf-8和gbk的多字节字符中都不会出现换行符，每块可以单独解码
+    :returns: start and end offset of each chunk
+    """
+    spans = []
+    start = 0
+    while start < len(data):
+        end = data.find(b'\n', start + size - 1)
+        end = len(data) if end == -1 else end + 1
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def convertChunk(inpath: Union[str, Path],
+                 start: int,
+                 end: int,
+                 encoding: str,
+                 report: bool,
+                 lookup: Optional[LookupConverter] = None) -> tuple[str, int, list[tuple[str, str]]]:
+    """
+    转换inpath中[start, end)的字节。
+    在子进程中运行时自己映射输入文件，只传回转换后的文本，lookup为None时使用_initWorker编译的查找表。
+    :returns: converted text with newlines normalized to \\n; number of changed lines; changed lines if report is True
+    """
+    import mmap
+    if lookup is None:
+        lookup = _WORKER_LOOKUP
+    if start != 0 and encoding == 'utf-8-sig':
+        # 只有文件开头可能有BOM
+        encoding = 'utf-8'
+    with open(inpath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode(encoding)
+    if '\r' in text:
+        # 与文本模式读取一样统一换行符
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    ntext = lookup.convert(text)
+    if ntext == text:
+        return ntext, 0, []
+    # 查找表的键和值中都没有换行符，转换前后行数相同
+    changed = [(line, nline) for line, nline in zip(text.split('\n'), ntext.split('\n')) if nline != line]
+    return ntext, len(changed), changed if report else []
+
+
+def doconvertBulk(inpath: Union[str, Path], outpath: Union[str, Path], lookup, jobs: int = 1, chunk_size: int = BULK_CHUNK):
+    """
+    大文件模式：先用开头的一段检测编码，再按块（在换行符处切分）并行转换，按顺序整块写出，输出与doconvert相同。
+    某一块无法解码时换用下一个编码重新转换。逐行记录只在logEnabled()时收集。
+    jobs: number of worker processes, 1 to convert in this process
+    """
+    import mmap
+    lookup = compileLookup(lookup)
+    report = logEnabled()
+    with open(inpath, 'rb') as f:
+        detected = detectEncoding(f.read(BULK_SAMPLE))
+        if detected is None:
+            print('\n错误！无法识别的文件编码，请将文件转存为UTF8或GBK编码格式再试！')
+            return False
+        if os.fstat(f.fileno()).st_size == 0:
+            spans = []
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                spans = splitLines(mm, chunk_size)
+
+    jobs = max(1, min(jobs, len(spans)))
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_initWorker, initargs=(lookup.lookup,))
+    try:
+        for encoding in ENCODINGS[ENCODINGS.index(detected):]:
+            cnter = 0
+            args = [(inpath, start, end, encoding, report) for start, end in spans]
+            if executor is None:
+                results = (convertChunk(*arg, lookup) for arg in args)
+            else:
+                results = executor.map(convertChunk, *zip(*args))
+            try:
+                with open(outpath, 'w', encoding=encoding) as outfile:
+                    for ntext, changed, lines in results:
+                        cnter += changed
+                        for line, nline in lines:
+                            verbose(line, '->\n\t', nline)
+                            verbose()
+                        outfile.write(ntext)
+            except UnicodeDecodeError:
+                continue
+            print('\n完成! 共转换了', cnter, '行，已保存至', str(outpath))
+            return True
+    except Exception as err:
+        print('\n发生了未知错误！请将下面的报错信息及待转换文件提交到 https://github.com/barryZZJ/SubtitleCleaner/issues\n')
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    print('\n错误！无法识别的文件编码，请将文件转存为UTF8或GBK编码格式再试！')
+    return False
+
+
 def main():
     parser = initparser()
     args = parser.parse_args()
+    setLevel(LEVELS[args.loglevel])
     if args.log:
         logpath = mkFilepath(args.InputFile, '.txt', '_log')
         setLogfile(logpath)
@@ -100,12 +276,16 @@ def main():
         print('正在读取', args.InputFile)
 
         outname = args.output or mkFilepath(args.InputFile, 'txt')
-        doconvert(args.InputFile, outname, lookup)
+        if args.bulk:
+            doconvertBulk(args.InputFile, outname, lookup, args.jobs)
+        else:
+            doconvert(args.InputFile, outname, lookup)
 
         print()
     except Exception as err:
         print(
             '\n发生了未知错误！请将下面的报错信息及待转换文件提交到 https://github.com/barryZZJ/SubtitleCleaner/issues')
+        import traceback
         traceback.print_exc()
     finally:
         if args.log:
@@ -117,4 +297,8 @@ def main():
             os.system('pause')
 
 if __name__ == '__main__':
+    import multiprocessing
+
+    # 打包为exe时，进程池的子进程会重新运行本程序，需要在这里转为执行子进程的任务
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,23 +1,33 @@
-import datetime
 import os
-import traceback
+import time
 from argparse import RawTextHelpFormatter
-from copy import deepcopy
 from typing import Optional
 
 import ass
+import utils.jsonlib as json
+from addict import Dict
 from ass import Dialogue
 
 from FullwidthConverter import convertline, lookup
 from utils.argparser import MyParser
 from utils.const import *
-from utils.logfile import _print, setLogfile, closeLogfile, print, warning, error
-from utils.misc import mkFilepath, remove_tags, overlaps, save, formatDelta, joinEvents, splitEvents
+from utils.intervals import overlapGroups, segmentStarts, timeArrays
+from utils.logfile import _print, setLogfile, setJsonLog, closeLogfile, setConsole, setLevel, logEnabled, \
+    jsonLogEnabled, logJson, print, verbose, warning, error, LEVELS
+from utils.misc import atomicWrite, mkFilepath, save
+from utils.mergeindex import MergeIndex
 from utils.mergetype import MergeType
-from utils.conf import loadConfigs, conf
-from utils.mydialogue import MyDialogue
-from utils.patterns import pairs, singlesufs, pats_rm, pats_rmcomment, pats_rmpairs, pats_prefix, \
-    pats_final, pats_speaker, texts_replace
+from utils.cache import ResultCache
+from utils.cleaningprofile import CleaningProfile
+from utils.incremental import IncrementalStore, groupUnits, splitUnits, textField, unitKey
+from utils.conf import ConfigError, loadConfigs
+from utils.mydialogue import MyDialogue, MyEventsSection, OriginalEvent, parseDoc, plain_text
+from utils.rules import RuleSet
+from utils.segments import Segment, cleanAcross, joinSegments
+from utils.stream import AssStreamReader, AssStreamWriter, EventTime, splitChunks
+from utils.timeline import formatMs
+from utils.watcher import FolderWatcher
+from utils.profiler import Profile, getProfile, setProfile, stage
 
 VER = 'v3.1.4'
 
@@ -30,51 +40,70 @@ DESCRIPTION = '字幕清理器\n' + \
 
 def initparser():
     parser = MyParser(description=DESCRIPTION, formatter_class=RawTextHelpFormatter)
-    parser.add_argument('InputFile', type=str, help='待转换ass文件的路径。', default='', nargs='?')
-    parser.add_argument('-o', '--output', type=str, help='输出文件路径，默认为<输入文件名>_cleaned。')
+    parser.add_argument('InputFile', type=str, help='待转换ass文件的路径。传入多个文件、文件夹或通配符（如*.ass）时进行批量处理。', nargs='*')
+    parser.add_argument('-o', '--output', type=str, help='输出文件路径，默认为<输入文件名>_cleaned。批量处理时为输出文件夹，默认为输入文件所在目录。')
     parser.add_argument('-q', '--quit', action='store_true', help='结束后不暂停程序直接退出，方便命令行调用。不加该参数程序结束时会暂停。')
     parser.add_argument('--offsetms', type=int, default=0, help='输出ass整体时间偏移毫秒数，负数为提前，正数为延后。')
     parser.add_argument('--log', action='store_true', help='记录日志，日志存储到同目录下的<输入文件名>_log.txt。')
+    parser.add_argument('--loglevel', choices=list(LEVELS), default='verbose', help='控制台输出级别：quiet只输出错误，summary只输出统计信息，verbose输出逐行记录（默认）。日志文件总是记录全部内容。')
+    parser.add_argument('--jsonlog', action='store_true', help='以JSON Lines格式逐条记录处理结果，存储到同目录下的<输入文件名>_log.jsonl。')
     parser.add_argument('--config', '-c', type=str, help='配置文件路径，默认为当前目录下的config.json。')
+    parser.add_argument('--stream', action='store_true', help='流式处理，逐段读取和写出字幕，适合很长的字幕文件。')
+    parser.add_argument('--profile', nargs='?', choices=['table', 'json'], const='table', help='统计各处理阶段及各条清理规则的耗时，结束时以表格（默认）或JSON格式输出。')
+    parser.add_argument('--incremental', action='store_true', help='增量处理，与上次处理同一文件时比较，只重新处理修改过的部分，适合修改源文件后重新处理。不能与--stream同时使用。')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存，总是重新处理。')
+    parser.add_argument('--cache-size', type=int, default=1024, help='结果缓存的最大容量（MB），默认为1024。增量处理的记录单独使用同样的上限。')
+    parser.add_argument('-w', '--watch', action='store_true', help='常驻运行，监视传入的文件夹，处理其中新出现的ass文件，按Ctrl+C结束。')
+    parser.add_argument('--interval', type=float, default=1.0, help='监视文件夹时的轮询间隔秒数，默认为1。')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='批量处理或监视文件夹时的最大并行进程数，默认为CPU核数。处理单个较大的文件且不输出逐行记录时，也用于分段并行处理。')
     return parser
 
 
-def cleanEvent(event:Dialogue, pats:list[tuple[re.Pattern, str]]):
-    text = event.text
-    for pat, repl in pats:
-        text = pat.sub(repl, text)
-    text = text.strip(' 　' + MERGE_SEP)  # 清理两边多余的半角和全角空格和分隔符
-    event.text = text
+STRIP_CHARS = ' 　' + MERGE_SEP
+'''清理后删除两边多余的半角和全角空格和分隔符'''
+
+
+def cleanText(text: str, pats: RuleSet) -> str:
+    return pats.apply(text, getProfile()).strip(STRIP_CHARS)
+
+
+def cleanEvent(event:Dialogue, pats: RuleSet):
+    event.text = cleanText(event.text, pats)
 
 
 def format_digit(event: Dialogue):
     text = event.text
-    digit_count = len(re.findall(r'\d', text))
-    if digit_count == 1:
+    # 只需要知道数字个数是0、1还是更多，找到第二个数字即可停止
+    first = pat_digit.search(text)
+    if first is None:
+        return
+    if pat_digit.search(text, first.end()) is None:
         # 一位数字替换成全角
-        text = re.sub(r'\d', lambda x: to_fullwidth.get(x.group(), x.group()), text)
-    elif digit_count > 1:
+        i = first.start()
+        text = text[:i] + to_fullwidth.get(text[i], text[i]) + text[i + 1:]
+    else:
         # 多位数字换成半角
-        out = ''
-        for c in text:
-            out += to_halfwidth.get(c, c)
-        text = out
+        text = text.translate(table_halfwidth)
     event.text = text
 
 
-def findMergeStart(event: MyDialogue, ignored_mergetypes: list[MergeType]) -> tuple[MergeType, str]:
+def findMergeStart(profile: CleaningProfile,
+                   index: MergeIndex,
+                   i: int,
+                   ignored_mergetypes: list[MergeType]) -> tuple[MergeType, str]:
     """
     :returns: mergetype and matched symbol
     """
+    conf = profile.conf
     if conf.merge.pair and MergeType.Pair not in ignored_mergetypes:
-        for pairleft in pairs:
-            if pairleft in event.plain_text:
-                return MergeType.Pair, pairleft
+        left = index.left(i)
+        if left:
+            return MergeType.Pair, left
 
     if conf.merge.singlesuf and MergeType.Singlesuf not in ignored_mergetypes:
-        for suf in singlesufs:
-            if event.plain_text.endswith(suf):
-                return MergeType.Singlesuf, suf
+        suf = index.suf(i)
+        if suf:
+            return MergeType.Singlesuf, suf
 
     if conf.merge.time and MergeType.Time not in ignored_mergetypes:
         return MergeType.Time, ''
@@ -82,7 +111,9 @@ def findMergeStart(event: MyDialogue, ignored_mergetypes: list[MergeType]) -> tu
     return MergeType.No, ''
 
 
-def findMergeEnd(events: list[Dialogue],
+def findMergeEnd(profile: CleaningProfile,
+                 events: list[Dialogue],
+                 index: MergeIndex,
                  start: int,
                  mergetype: MergeType,
                  symb: str='') -> tuple[int, str]:
@@ -90,14 +121,12 @@ def findMergeEnd(events: list[Dialogue],
     symb: merge symbol to look for
     :returns: end index that should be merged; merge reason, or warning msg if end index == -1
     """
+    pairs = profile.pairs
     if mergetype == MergeType.Pair:
-        j = start
         reason = pairs.inv[symb] + '...' + symb
 
-        while j < len(events) and symb not in events[j].text:
-            j += 1
-
-        if j == len(events):
+        j = index.nextRight(symb, start)
+        if j == -1:
             # error
             reason = '仅匹配到' + pairs.inv[symb] + '，请确认左右括号个数一致！'
             return -1, reason
@@ -106,6 +135,9 @@ def findMergeEnd(events: list[Dialogue],
     elif mergetype == MergeType.Singlesuf:
         j = start + 1
         reason = symb
+        if j == len(events):
+            # 最后一行以symb结尾，没有可以合并的下一行
+            return start, reason
 
         while j < len(events) - 1 and events[j].text.endswith(symb):
             # 如果j是数组最后一个，不论是否还以symb结尾，都直接返回
@@ -114,41 +146,40 @@ def findMergeEnd(events: list[Dialogue],
         return j, reason
 
     elif mergetype == MergeType.Time:
-        j = start + 1
         reason = '时间重合'
-
-        while j < len(events) and overlaps(events[j-1], events[j]):
-            j += 1
-
-        # j-1是最后一个有时间重合的
-        return j-1, reason
+        return index.overlapEnd(start), reason
 
     else:
         raise NotImplementedError('Unexpected mergetype ' + str(mergetype))
 
 
-def findMergeInterval(events: list[MyDialogue], start: int, ignored_mergetypes: list[MergeType]) -> tuple[int, str, MergeType]:
+def findMergeInterval(profile: CleaningProfile,
+                      events: list[MyDialogue],
+                      index: MergeIndex,
+                      start: int,
+                      ignored_mergetypes: list[MergeType]) -> tuple[int, str, MergeType]:
     """
     :returns: end index of merged events; merge reason (or warning msg if end index == -1); Mergetype
     """
-    eventL = events[start]
-    mergetype, symb = findMergeStart(eventL, ignored_mergetypes)
+    mergetype, symb = findMergeStart(profile, index, start, ignored_mergetypes)
 
     reason = ''
     if mergetype == MergeType.No:
         return start, reason, MergeType.No
 
     if mergetype == MergeType.Pair:
-        symbR = pairs[symb]
-        end, reason = findMergeEnd(events, start, mergetype, symbR)
+        symbR = profile.pairs[symb]
+        end, reason = findMergeEnd(profile, events, index, start, mergetype, symbR)
     else:
-        end, reason = findMergeEnd(events, start, mergetype, symb)
+        end, reason = findMergeEnd(profile, events, index, start, mergetype, symb)
 
     return end, reason, mergetype
 
 
 def mergeEvents(
+    profile: CleaningProfile,
     events: list[MyDialogue],
+    index: MergeIndex,
     start: int,
     limit: int,
     procid: int,
@@ -159,12 +190,15 @@ def mergeEvents(
     """
     returns: end index of merged events; merged events; start and end index of each merged event
     """
-    merge_list: list[MyDialogue] = [events[start]]  # 所有需要合并的对白
+    conf = profile.conf
+    # 所有需要合并的行号，及与上一行的合并方式
+    merge_list: list[tuple[int, MergeType]] = [(start, events[start].mergetype)]
     start_ = start
     ignored_mergetypes = []  # 不考虑的mergetype
     while True:
         # 考虑到存在下一行时间仍相同，或者出现新的标识符的情况，故不断搜索直到没有合并的情况
-        end, reason, mergetype = findMergeInterval(events, start_, ignored_mergetypes)
+        with stage('merge.find'):
+            end, reason, mergetype = findMergeInterval(profile, events, index, start_, ignored_mergetypes)
 
         if end == -1:
             warning(reason)
@@ -180,116 +214,128 @@ def mergeEvents(
             continue
 
         log_reason.append(reason)
-        merge_list.extend(MyDialogue(event, mergetype) for event in events[start_+1:end+1])
+        merge_list.extend((j, mergetype) for j in range(start_+1, end+1))
         start_ = end
 
-    for event in merge_list:
+    with stage('merge.pats_rm'):
         # 清理各种符号
-        cleanEvent(event, pats_rm)
+        texts = [cleanText(events[j].text, profile.pats_rm) for j, _ in merge_list]
 
     # clean format_tags (remove all or only keep the first one)
-    events_need_remove_tags = (merge_list if conf.remove_format_tags else merge_list[1:])
-    for event in events_need_remove_tags:
-        remove_tags(event)
-
-    # 1.合并后清理，2.再拆开，3.然后再每隔limit个用conf.merge.sep合并在一起
-    # 1.
-    merged = joinEvents(
-        merge_list,
-        sep=MERGE_SEP,
-        sep_on_overlap=MERGE_SEP_ON_OVERLAP,
-        ignore_sep_on_pairs=False
-    )
-    cleanEvent(merged, pats_rmpairs)
-    if conf.remove_comments:
-        cleanEvent(merged, pats_rmcomment)
-    # 2.
-    merge_list_cleaned = splitEvents(
-        merged,
-        sep=MERGE_SEP,
-        sep_on_overlap=MERGE_SEP_ON_OVERLAP,
-        overlapped_chunk_prefix=OVERLAPPED_CHUNK_PREFIX
-    )
-    # 3.
-    merged_events = []
-    limit = len(merge_list_cleaned) if limit <= 0 else limit
-    if ignore_limit_on_overlap:
-        limit = len(merge_list_cleaned)
-    for i in range(0, len(merge_list_cleaned), limit):
-        joined = joinEvents(
-            merge_list_cleaned[i: i+limit],
-            sep=conf.merge.sep,
-            sep_on_overlap=conf.merge.sep_on_overlap,
-            special_prefix=conf.merge.special_prefix,
-            sep_on_special_prefix=conf.merge.sep_on_special_prefix,
-            ignore_sep_on_pairs=True
-        )
-        merged_events.append(joined)
+    with stage('merge.remove_tags'):
+        for k in range(0 if conf.remove_format_tags else 1, len(texts)):
+            texts[k] = plain_text(texts[k])
+
+    with stage('merge.join_split'):
+        # 1.合并后跨行清理，各行保持分开，2.然后再每隔limit行用conf.merge.sep合并在一起
+        # 1.
+        # 空行不参与合并，也不延长结束时间
+        segments = [Segment(texts[0], merge_list[0][1])]
+        merged_end = index.ends[start]
+        for text, (j, mergetype) in zip(texts[1:], merge_list[1:]):
+            if text:
+                segments.append(Segment(text, mergetype))
+                merged_end = index.ends[j]
+        segments = cleanAcross(segments, profile.pats_rmpairs, STRIP_CHARS)
+        if conf.remove_comments:
+            segments = cleanAcross(segments, profile.pats_rmcomment, STRIP_CHARS)
+        # 2.
+        merged_events = []
+        limit = len(segments) if limit <= 0 else limit
+        if ignore_limit_on_overlap:
+            limit = len(segments)
+        for i in range(0, len(segments), limit):
+            group = segments[i: i+limit]
+            joined = MyDialogue(events[start], group[0].mergetype)
+            joined.text = joinSegments(
+                group,
+                profile.pairs,
+                sep=conf.merge.sep,
+                sep_on_overlap=conf.merge.sep_on_overlap,
+                special_prefix=conf.merge.special_prefix,
+                sep_on_special_prefix=conf.merge.sep_on_special_prefix,
+            )
+            joined.end = merged_end
+            merged_events.append(joined)
     return end, merged_events
 
 
-def processDoc(doc: ass.Document,
-               lookup: dict,
-               offsetms: datetime.timedelta) -> ass.Document:
+def newCounters() -> Dict:
+    return Dict(merged=0, ono=0, converted=0, overlaps=0, procid=0, outid=0, warnings=[])
 
-    events_old = [None] * len(doc.events)  # type: list[Optional[Dialogue]]
-    for i, event in enumerate(doc.events):
+
+def processEvents(events: list,
+                  profile: CleaningProfile,
+                  offsetms: int,
+                  cnt: Dict) -> list[MyDialogue]:
+    """
+    合并、清理一段连续的事件，events会被原地修改。
+    cnt: counters from newCounters(), carried over between consecutive calls
+    :returns: output events
+    """
+    conf = profile.conf
+    log = logEnabled()
+    jsonlog = jsonLogEnabled()
+    events_old = [None] * len(events)  # type: list[Optional[OriginalEvent]]
+    for i, event in enumerate(events):
         if event.TYPE == 'Dialogue':
             # add plain_text field for easier merge finding
-            doc.events[i] = MyDialogue(doc.events[i])
+            if not isinstance(event, MyDialogue):
+                events[i] = MyDialogue(event)
             # record old event for logging
-            events_old[i] = deepcopy(event)
+            if log or jsonlog:
+                events_old[i] = OriginalEvent.of(events[i])
+    with stage('index'):
+        index = MergeIndex(events, profile.pairs, profile.singlesufs)
 
-    warnings = []
+    warnings = cnt.warnings
     events_out = []
-    cnter_mg = 0
-    cnter_ono = 0
-    cnter_cv = 0
-    procid = 0  # number of processed lines
-    outid = 0  # line number of output
-    print('\n开始处理字幕...\n')
+    cnter_mg = cnt.merged
+    cnter_ono = cnt.ono
+    cnter_cv = cnt.converted
+    procid = cnt.procid  # number of processed lines
+    outid = cnt.outid  # line number of output
     i = 0  # event index
-    while i < len(doc.events):
+    while i < len(events):
         # filter out non Dialogue and non rubi
-        if doc.events[i].TYPE != 'Dialogue' or (doc.events[i].style.lower() == 'rubi' and conf.remove_rubi):
-            if doc.events[i].style.lower() == 'rubi':
-                print('[跳过Rubi台词]')
-                print(doc.events[i].text)
-                print()
+        if events[i].TYPE != 'Dialogue' or (events[i].style.lower() == 'rubi' and conf.remove_rubi):
+            if events[i].style.lower() == 'rubi':
+                verbose('[跳过Rubi台词]')
+                verbose(events[i].text)
+                verbose()
+                if jsonlog:
+                    logJson(dict(type='rubi', text=events[i].text))
 
             i += 1
             continue
 
         procid += 1
 
-        # reason = ''
-        # 清理语气词 # TODO 开关
-        # tmp = nline
-        # nline = cleanline(nline, pats_ono)
-        # if nline != tmp:
-        #     reason = '[清理语气词]'
-        #     print(reason)
-        #     cnter_ono += 1
-
         # merge and clean lines
-        # end, reason = findMergeInterval(doc.events, i)
-        if not doc.events[i].text:
-            time_start = formatDelta(events_old[i].start)
-            time_end = formatDelta(events_old[i].end)
-            text = events_old[i].text
-            print(f'{procid}.\n'+time_start, time_end, text, '\n->\n<删除>')
-            print()
+        # end, reason = findMergeInterval(events, i)
+        if not events[i].text:
+            if log:
+                time_start = formatMs(events_old[i].start)
+                time_end = formatMs(events_old[i].end)
+                text = events_old[i].text
+                verbose(f'{procid}.\n'+time_start, time_end, text, '\n->\n<删除>')
+                verbose()
+            if jsonlog:
+                logJson(dict(type='event', id=procid, reasons=[], src=[events_old[i]._asdict()], out=[]))
             i += 1
             continue
 
         log_reason = []
-        if doc.events[i].style.lower() == 'rubi':
+        nwarnings = len(warnings)
+        if events[i].style.lower() == 'rubi':
             # don't merge rubi
-            end, merged_events = i, [doc.events[i]]
+            end, merged_events = i, [events[i]]
         else:
             # merged_events包含了从第i个开始所有要合并的event
             end, merged_events = mergeEvents(
-                doc.events,
+                profile,
+                events,
+                index,
                 i,
                 conf.merge.limit,
                 procid,
@@ -300,104 +346,780 @@ def processDoc(doc: ass.Document,
         if end != i:
             cnter_mg += end - i + 1
 
-        print(f'{procid}.', ' '.join(log_reason))
+        verbose(f'{procid}.', ' '.join(log_reason))
 
         # 这里得到的是已经合并了的event，只不过根据limit又进行了分隔
         for event in merged_events:
             # convert half-width katakana and symbols
             if conf.convert_width:
-                converted = convertline(event.text, lookup)
+                with stage('convert_width'):
+                    converted = convertline(event.text, profile.lookup)
                 if converted != event.text:
                     event.text = converted
                     reason = '[转换假名]'
-                    print(reason)
+                    verbose(reason)
                     cnter_cv += 1
 
             # post process
             # 删除说话人
             if conf.remove_speaker:
-                cleanEvent(event, pats_speaker)
+                with stage('remove_speaker'):
+                    cleanEvent(event, profile.pats_speaker)
+            # 清理语气词，在全角空格转换、删除说话人之后
+            if conf.remove_ono:
+                with stage('remove_ono'):
+                    cleaned = profile.pat_ono.sub('', event.text)
+                if cleaned != event.text:
+                    event.text = cleaned
+                    verbose('[清理语气词]')
+                    cnter_ono += 1
             # 处理数字
             if conf.format_digit:
-                format_digit(event)
+                with stage('format_digit'):
+                    format_digit(event)
             # 替换文本
-            converted = event.text
-            for key, val in texts_replace.items():
-                converted = converted.replace(key, val)
+            with stage('texts_replace'):
+                converted = profile.texts_replace.replace(event.text)
             if converted != event.text:
                 event.text = converted
-                print('[替换文本]')
+                verbose('[替换文本]')
             # 添加\N
             if conf.add_newline_prefix:
-                cleanEvent(event, pats_prefix)
+                with stage('newline_prefix'):
+                    cleanEvent(event, profile.pats_prefix)
 
-            cleanEvent(event, pats_final)
+            with stage('pats_final'):
+                cleanEvent(event, profile.pats_final)
 
             event.start += offsetms
             event.end += offsetms
 
-        tmp = []
-        for ind in range(i, end + 1):
-            time_start = formatDelta(events_old[ind].start)
-            time_end = formatDelta(events_old[ind].end)
-            text = events_old[ind].text
-            tmp.append((time_start, time_end, text))
-        print(' +\n'.join([time_start + ' ' + time_end + ' ' + text for time_start, time_end, text in tmp]))
-        print('->')
-
+        if log:
+            tmp = []
+            for ind in range(i, end + 1):
+                time_start = formatMs(events_old[ind].start)
+                time_end = formatMs(events_old[ind].end)
+                text = events_old[ind].text
+                tmp.append((time_start, time_end, text))
+            verbose(' +\n'.join([time_start + ' ' + time_end + ' ' + text for time_start, time_end, text in tmp]))
+            verbose('->')
+
+        out = []
         for event in merged_events:
             if event.text and event.text != '\\N':
                 outid += 1
-                time_start = formatDelta(event.start)
-                time_end = formatDelta(event.end)
-                text = event.text
-                print(f'[{outid}]', time_start, time_end, text)
+                if log:
+                    time_start = formatMs(event.start)
+                    time_end = formatMs(event.end)
+                    text = event.text
+                    verbose(f'[{outid}]', time_start, time_end, text)
+                if jsonlog:
+                    out.append(dict(id=outid, start=event.start, end=event.end, text=event.text))
                 events_out.append(event)
             else:
-                print('<删除>')
-
-        print()
+                verbose('<删除>')
+
+        if jsonlog:
+            logJson(dict(
+                type='event',
+                id=procid,
+                reasons=log_reason,
+                src=[event and event._asdict() for event in events_old[i:end+1]],
+                out=out,
+                warnings=[msg for _, msg in warnings[nwarnings:]],
+            ))
+
+        verbose()
         i = end + 1
 
+    cnt.update(merged=cnter_mg, ono=cnter_ono, converted=cnter_cv, procid=procid, outid=outid)
+    return events_out
+
+
+def addActorTag(event: Dialogue, tag: str):
+    if event.name != '': event.name += ';'
+    event.name += tag
+
+
+def addActorTagLine(line: str, tags: list[str], field_order: list[str]) -> str:
+    """
+    在dump_with_type的结果的Name栏依次加上tags，与解析后逐个addActorTag再dump的结果相同。
+    不重新解析整行，解析会改变无法按原样读回的栏（如负数的时间）
+    """
+    if 'Name' not in field_order:
+        return line
+    type_name, _, line = line.partition(': ')
+    fields = line.split(',', len(field_order) - 1)
+    i = field_order.index('Name')
+    fields[i] = ';'.join(([fields[i]] if fields[i] else []) + tags)
+    return type_name + ': ' + ','.join(fields)
+
+
+def actorTags(profile: CleaningProfile, events_out: list) -> tuple[dict[int, list[str]], int]:
+    """
+    events_out: output events, or any records with start and end
+    :returns: tags to append to the "actor" field of each output index, in order; number of overlaps
+    """
+    conf = profile.conf
+    tags: dict[int, list[str]] = {}
+
     # 在"actor"栏标注分段/分工
-    if 1 <= conf.mark_segment <= len(events_out):
-        segment_num = 1
-        for i in range(0, len(events_out), len(events_out)//conf.mark_segment):
-            if events_out[i].name != '': events_out[i].name += ';'
-            events_out[i].name += '分段' + str(segment_num) + '开始'
-            segment_num += 1
+    for segment_num, i in enumerate(segmentStarts(len(events_out), conf.mark_segment), 1):
+        tags.setdefault(i, []).append('分段' + str(segment_num) + '开始')
 
     # 在"actor"栏标注时间重叠情况
     overlap_id = 0
     if conf.mark_overlap:
-        i = 0
-        while i < len(events_out) - 1:
-            overlap_end = i
-            while overlap_end < len(events_out) - 1 and overlaps(events_out[overlap_end], events_out[overlap_end+1]):
-                overlap_end += 1
-            if overlap_end != i:
-                overlap_id += 1
-                for j in range(i, overlap_end+1):
-                    if events_out[j].name != '': events_out[j].name += ';'
-                    events_out[j].name += '时间重叠' + str(overlap_id)
-            i = overlap_end + 1
-
-    print('处理完成！共合并了', cnter_mg, '行文本，清理了', cnter_ono, '行对白的语气词，转换了', cnter_cv, '行对白的假名，存在', overlap_id, '处时间重叠，最终生成了', outid, '行对白。')
-
-    if warnings:
+        for overlap_id, group in enumerate(overlapGroups(*timeArrays(events_out)), 1):
+            for j in group:
+                tags.setdefault(j, []).append('时间重叠' + str(overlap_id))
+
+    return tags, overlap_id
+
+
+def printSummary(cnt: Dict, stats: Optional[dict]):
+    print('处理完成！共合并了', cnt.merged, '行文本，清理了', cnt.ono, '行对白的语气词，转换了', cnt.converted, '行对白的假名，存在', cnt.overlaps, '处时间重叠，最终生成了', cnt.outid, '行对白。')
+
+    if cnt.warnings:
         print('\n存在WARNING，请根据下方信息向上查找对应记录')
-        for procid, msg in warnings:
+        for procid, msg in cnt.warnings:
             print(f'{procid}.', msg)
 
+    if jsonLogEnabled():
+        logJson(dict(
+            type='summary',
+            merged=cnt.merged,
+            ono=cnt.ono,
+            converted=cnt.converted,
+            overlaps=cnt.overlaps,
+            output=cnt.outid,
+            warnings=cnt.warnings,
+        ))
+
+    if stats is not None:
+        stats.update(
+            merged=cnt.merged,
+            ono=cnt.ono,
+            converted=cnt.converted,
+            overlaps=cnt.overlaps,
+            output=cnt.outid,
+            warnings=len(cnt.warnings),
+        )
+
+
+def cleanDocument(doc: ass.Document,
+                  profile: CleaningProfile,
+                  offsetms: int = 0,
+                  cnt: Optional[Dict] = None) -> ass.Document:
+    """
+    按profile清理整个字幕，doc.events会被替换为输出的事件。
+    只读取profile，不修改任何全局状态，可以在多个线程中同时调用（逐行记录仍输出到logfile中设置的全局日志）。
+    cnt: if given, a fresh newCounters() to be filled with the counters of the summary
+    """
+    if cnt is None:
+        cnt = newCounters()
+    events_out = processEvents(doc.events, profile, offsetms, cnt)
+
+    with stage('actor_tags'):
+        tags, cnt.overlaps = actorTags(profile, events_out)
+        for i, event_tags in tags.items():
+            for tag in event_tags:
+                addActorTag(events_out[i], tag)
+
     doc.events = events_out
     return doc
 
 
+def processDoc(doc: ass.Document,
+               profile: CleaningProfile,
+               offsetms: int,
+               stats: Optional[dict] = None,
+               cnt: Optional[Dict] = None) -> ass.Document:
+    """
+    stats: if given, filled with the counters printed in the summary
+    cnt: if given, a fresh newCounters() to be filled
+    """
+    if cnt is None:
+        cnt = newCounters()
+    print('\n开始处理字幕...\n')
+    cleanDocument(doc, profile, offsetms, cnt)
+    printSummary(cnt, stats)
+    return doc
+
+
+def processStream(inpath: Path,
+                  outpath: Path,
+                  profile: CleaningProfile,
+                  offsetms: int,
+                  stats: Optional[dict] = None,
+                  cnt: Optional[Dict] = None):
+    """
+    流式处理：逐段读取、处理并写出事件，只在内存中保留合并所需的一段事件。
+    ass格式先写入临时文件，最后再标注分段和时间重叠（需要知道输出的总行数）。
+    """
+    import shutil
+    import tempfile
+
+    conf = profile.conf
+    if cnt is None:
+        cnt = newCounters()
+    times: list[EventTime] = []
+    with open(inpath, encoding='utf-8-sig') as fin, tempfile.TemporaryFile('w+', encoding='utf8') as ftmp:
+        reader = AssStreamReader(fin)
+        print('\n开始处理字幕...\n')
+        chunks = splitChunks(reader.events(), profile.pairs, profile.singlesufs, conf.merge.time, STREAM_CHUNK, STREAM_WINDOW)
+        for chunk in chunks:
+            for event in processEvents(chunk, profile, offsetms, cnt):
+                # txt格式不标注，但时间重叠的个数仍要统计
+                times.append(EventTime(event.start, event.end))
+                if conf.format == 'txt':
+                    ftmp.write(event.text)
+                    ftmp.write('\n')
+                else:
+                    ftmp.write(event.dump_with_type(reader.section.field_order))
+                    ftmp.write('\n')
+
+        with stage('actor_tags'):
+            tags, cnt.overlaps = actorTags(profile, times)
+        ftmp.seek(0)
+        if conf.format == 'txt':
+            with atomicWrite(outpath, encoding='utf8') as fout:
+                shutil.copyfileobj(ftmp, fout)
+        elif conf.format == 'ass':
+            with atomicWrite(outpath, encoding='utf_8_sig') as fout:
+                writer = AssStreamWriter(fout, reader.doc)
+                for i, line in enumerate(ftmp):
+                    if i in tags:
+                        line = addActorTagLine(line.rstrip('\n'), tags[i], reader.section.field_order) + '\n'
+                    writer.writeRaw(line)
+                writer.close(reader.tail)
+        else:
+            raise NotImplementedError('不支持的输出文件格式: ' + conf.format)
+
+    printSummary(cnt, stats)
+
+
+def processUnit(events: list,
+                profile: CleaningProfile,
+                offsetms: int,
+                cnt: Dict,
+                field_order: list[str]) -> dict:
+    """
+    用processEvents处理一段可以单独处理的事件（见splitUnits），返回可以保存或在进程间传递的记录：
+    统计的增量、warning（编号为段内的相对编号）和输出事件的时间及dump_with_type的结果
+    """
+    procid, merged, ono, converted, nwarnings = cnt.procid, cnt.merged, cnt.ono, cnt.converted, len(cnt.warnings)
+    events_out = processEvents(events, profile, offsetms, cnt)
+    return dict(
+        procs=cnt.procid - procid,
+        merged=cnt.merged - merged,
+        ono=cnt.ono - ono,
+        converted=cnt.converted - converted,
+        warnings=[[i - procid, msg] for i, msg in cnt.warnings[nwarnings:]],
+        out=[[event.start, event.end, event.dump_with_type(field_order)] for event in events_out],
+    )
+
+
+def mergeRecord(cnt: Dict, record: dict):
+    """把不在当前处理中得到的processUnit记录（上次增量处理保存的或子进程返回的）计入cnt"""
+    for i, msg in record['warnings']:
+        # 与直接处理时一样在控制台输出，便于对照
+        warning(msg)
+        cnt.warnings.append((cnt.procid + i, msg))
+    cnt.update(
+        merged=cnt.merged + record['merged'],
+        ono=cnt.ono + record['ono'],
+        converted=cnt.converted + record['converted'],
+        procid=cnt.procid + record['procs'],
+        outid=cnt.outid + len(record['out']),
+    )
+
+
+def saveLines(lines: list[str], tags: dict[int, list[str]], reader: AssStreamReader, outpath: Path, fmt: str):
+    """
+    保存processUnit记录中的输出行，按actorTags的结果标注Actor栏，其余行原样写出
+    reader: 已读取完事件的AssStreamReader，提供事件以外的部分
+    """
+    field_order = reader.section.field_order
+    if fmt == 'txt':
+        with atomicWrite(outpath, encoding='utf8') as fout:
+            for line in lines:
+                fout.write(textField(line, field_order))
+                fout.write('\n')
+    elif fmt == 'ass':
+        with atomicWrite(outpath, encoding='utf_8_sig') as fout:
+            writer = AssStreamWriter(fout, reader.doc)
+            for i, line in enumerate(lines):
+                if i in tags:
+                    line = addActorTagLine(line, tags[i], field_order)
+                writer.writeRaw(line + '\n')
+            writer.close(reader.tail)
+    else:
+        raise NotImplementedError('不支持的输出文件格式: ' + fmt)
+
+
+def processIncremental(inpath: Path,
+                       outpath: Path,
+                       profile: CleaningProfile,
+                       offsetms: int,
+                       store: IncrementalStore,
+                       stats: Optional[dict] = None,
+                       cnt: Optional[Dict] = None):
+    """
+    增量处理：把事件切分为互不影响的最小单元，与上次处理同一输出文件时记录的单元比较，
+    只重新处理新增或修改过的单元，其余单元直接使用记录的输出，最后重新标注分段和时间重叠。
+    处理参数（版本、配置、偏移等）与上次不同时全部重新处理。逐行记录只包含重新处理的单元。
+    """
+    conf = profile.conf
+    if cnt is None:
+        cnt = newCounters()
+    with open(inpath, encoding='utf-8-sig') as fin:
+        reader = AssStreamReader(fin)
+        with stage('parse'):
+            raw = list(reader.rawEvents())
+    field_order = reader.section.field_order
+    header = dict(version=VER, output_version=OUTPUT_VER, fingerprint=profile.fingerprint(), offsetms=offsetms, field_order=field_order)
+    state = store.load(outpath)
+    old_units = state['units'] if state and state.get('header') == header else {}
+
+    print('\n开始处理字幕...\n')
+    with stage('index'):
+        units = splitUnits(raw, field_order, profile.pairs, profile.singlesufs, conf.merge.time)
+    new_units = {}
+    lines: list[str] = []
+    times: list[EventTime] = []
+    reused = 0
+    for unit in units:
+        key = unitKey(unit)
+        record = new_units.get(key) or old_units.get(key)
+        if record is None:
+            events = [reader.parse(type_name, line) for type_name, line in unit]
+            record = processUnit(events, profile, offsetms, cnt, field_order)
+        else:
+            reused += 1
+            mergeRecord(cnt, record)
+        new_units[key] = record
+        for start, end, line in record['out']:
+            times.append(EventTime(start, end))
+            lines.append(line)
+    print('共', len(units), '个单元，其中', reused, '个与上次处理时相同，已直接使用上次的结果\n')
+
+    with stage('actor_tags'):
+        tags, cnt.overlaps = actorTags(profile, times)
+    with stage('save'):
+        saveLines(lines, tags, reader, outpath, conf.format)
+        store.save(outpath, dict(header=header, units=new_units))
+
+    printSummary(cnt, stats)
+
+
+def _initPartWorker(conf_dict: dict):
+    # 子进程不向控制台输出，warning由主进程按顺序重新输出
+    setConsole(False)
+    _initWorker(conf_dict)
+
+
+def processPart(events: list[tuple[str, str]], field_order: list[str], offsetms: int, timing: bool) -> tuple[dict, Optional[dict]]:
+    """
+    分段并行处理时子进程中的任务，events为连续若干个单元的未解析事件
+    :returns: record of processUnit, and timings if timing is True
+    """
+    if timing:
+        setProfile(Profile())
+    try:
+        parsers = MyEventsSection.line_parsers
+        with stage('parse'):
+            events = [parsers[type_name.lower()].parse(type_name, line, field_order) for type_name, line in events]
+        record = processUnit(events, _WORKER_PROFILE, offsetms, newCounters(), field_order)
+        return record, getProfile().to_dict() if timing else None
+    finally:
+        if timing:
+            setProfile(None)
+
+
+def processParallel(inpath: Path,
+                    outpath: Path,
+                    profile: CleaningProfile,
+                    offsetms: int,
+                    jobs: int,
+                    stats: Optional[dict] = None,
+                    cnt: Optional[Dict] = None):
+    """
+    分段并行处理单个文件：在所有可以切分的位置（见splitUnits）中选出若干处，把事件分为约jobs*PARALLEL_PARTS段，
+    在多个进程中处理后按顺序拼接，编号、统计、warning以及分段和时间重叠的标注都与完整处理相同。
+    逐行记录无法在子进程中按顺序编号，调用前应确认没有开启（见cleanPath）。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
+
+    global _WORKER_PROFILE
+    _WORKER_PROFILE = profile
+    conf = profile.conf
+    if cnt is None:
+        cnt = newCounters()
+    with open(inpath, encoding='utf-8-sig') as fin:
+        reader = AssStreamReader(fin)
+        with stage('parse'):
+            raw = list(reader.rawEvents())
+    field_order = reader.section.field_order
+
+    print('\n开始处理字幕...\n')
+    with stage('index'):
+        units = splitUnits(raw, field_order, profile.pairs, profile.singlesufs, conf.merge.time)
+        parts = groupUnits(units, jobs * PARALLEL_PARTS)
+    jobs = max(1, min(jobs, len(parts)))
+    print('共', len(units), '个单元，分为', len(parts), '段，并行进程数', jobs, '\n')
+
+    timing = getProfile() is not None
+    lines: list[str] = []
+    times: list[EventTime] = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initPartWorker, initargs=(conf.to_dict(),)) as executor:
+        results = executor.map(processPart, parts, repeat(field_order), repeat(offsetms), repeat(timing))
+        for record, timings in results:
+            mergeRecord(cnt, record)
+            if timings is not None:
+                getProfile().update(timings)
+            for start, end, line in record['out']:
+                times.append(EventTime(start, end))
+                lines.append(line)
+
+    with stage('actor_tags'):
+        tags, cnt.overlaps = actorTags(profile, times)
+    with stage('save'):
+        saveLines(lines, tags, reader, outpath, conf.format)
+
+    printSummary(cnt, stats)
+
+
+def expandInputs(inputs: list[str]) -> list[Path]:
+    """
+    展开输入的文件、文件夹（其中的*.ass，跳过已清理的输出）和通配符，去重并保持顺序
+    """
+    import glob
+
+    files = []
+    for inp in inputs:
+        p = Path(inp)
+        if p.is_dir():
+            files.extend(sorted(f for f in p.glob('*.ass') if not f.stem.endswith('_cleaned')))
+        elif p.is_file():
+            files.append(p)
+        else:
+            matched = sorted(Path(f) for f in glob.glob(inp) if Path(f).is_file())
+            assert matched, '输入文件不存在：' + str(p.absolute())
+            files.extend(matched)
+    return list(dict.fromkeys(f.resolve() for f in files))
+
+
+def reportProfile(profile: Profile, fmt: str):
+    print('\n耗时统计：')
+    if fmt == 'json':
+        print(json.dumps(profile.to_dict()))
+    else:
+        print(profile.report())
+
+
+def readDoc(inpath: Path) -> ass.Document:
+    with stage('parse'), open(inpath, encoding='utf-8-sig') as f:
+        return parseDoc(f)
+
+
+def saveDoc(doc: ass.Document, outpath: Path, fmt: str):
+    with stage('save'):
+        save(fmt, doc, outpath)
+
+
+SUMMARY_KEYS = ('merged', 'ono', 'converted', 'overlaps', 'outid', 'warnings')
+"""缓存中保存的统计信息"""
+
+
+def cleanPath(inpath: Path,
+              outpath: Path,
+              profile: CleaningProfile,
+              offsetms: int,
+              stream: bool = False,
+              stats: Optional[dict] = None,
+              cache: Optional[ResultCache] = None,
+              store: Optional[IncrementalStore] = None,
+              jobs: int = 1):
+    """
+    处理inpath并保存到outpath。
+    cache: if given, reuse the result of the same input and parameters (unless logging to a file), and store the result on miss
+    store: if given, process incrementally against the previous run on the same outpath
+    jobs: 大于1时，较大的文件在没有逐行记录时分段并行处理（见processParallel），结果与完整处理相同
+    """
+    if cache is not None:
+        with stage('cache'):
+            with open(inpath, 'rb') as f:
+                key = cache.key(f, VER, str(OUTPUT_VER), profile.fingerprint(), str(offsetms), 'stream' if stream else 'doc')
+            # 缓存中没有逐行记录，需要写日志时总是重新处理，处理后仍更新缓存
+            summary = None if logEnabled() or jsonLogEnabled() else cache.get(key, outpath)
+        if summary is not None:
+            print('\n输入文件和配置与之前处理过的相同，使用缓存的结果\n')
+            printSummary(Dict(summary), stats)
+            return
+
+    cnt = newCounters()
+    if stream:
+        processStream(inpath, outpath, profile, offsetms, stats, cnt)
+    elif store is not None:
+        processIncremental(inpath, outpath, profile, offsetms, store, stats, cnt)
+    elif jobs > 1 and not (logEnabled() or jsonLogEnabled()) and inpath.stat().st_size >= PARALLEL_MIN_SIZE:
+        processParallel(inpath, outpath, profile, offsetms, jobs, stats, cnt)
+    else:
+        doc = processDoc(readDoc(inpath), profile, offsetms, stats, cnt)
+        saveDoc(doc, outpath, profile.conf.format)
+
+    if cache is not None:
+        with stage('cache'):
+            cache.put(key, outpath, {k: cnt[k] for k in SUMMARY_KEYS})
+
+
+_WORKER_PROFILE: Optional[CleaningProfile] = None
+"""批量处理时各任务共用的profile"""
+_WORKER_CACHE: Optional[ResultCache] = None
+_WORKER_STORE: Optional[IncrementalStore] = None
+"""批量处理时各任务共用的结果缓存和增量处理记录，每个进程一份，总大小的估计在任务之间保留"""
+
+
+def _initWorker(conf_dict: dict, cache: Optional[ResultCache] = None, store: Optional[IncrementalStore] = None):
+    global _WORKER_PROFILE, _WORKER_CACHE, _WORKER_STORE
+    if _WORKER_PROFILE is None:
+        # spawn方式启动的子进程不会继承主进程中编译的profile，只编译规则不重写配置文件
+        _WORKER_PROFILE = CleaningProfile.fromConf(Dict(conf_dict), lookup)
+    # 缓存只在启动子进程时传入一次，不随每个任务传入，否则每个任务都是新的副本，每次写入都要重新扫描缓存目录
+    _WORKER_CACHE, _WORKER_STORE = cache, store
+
+
+def cleanFile(inpath: Path,
+              outpath: Path,
+              logpath: Optional[Path],
+              jsonlogpath: Optional[Path],
+              offsetms: int,
+              stream: bool = False,
+              timing: bool = False) -> dict:
+    """
+    批量处理中的单个任务，逐行记录只写入日志文件，使用进程中共用的profile、结果缓存和增量处理记录（见_initWorker）
+    :returns: stats of processDoc, with `error` set to the traceback on failure, and `profile` if timing is True
+    """
+    profile = _WORKER_PROFILE
+    stats = Dict(input=str(inpath), outpath=str(outpath), error='')
+    setConsole(False)
+    if timing:
+        setProfile(Profile())
+    if logpath:
+        setLogfile(logpath)
+    if jsonlogpath:
+        setJsonLog(jsonlogpath)
+    try:
+        cleanPath(inpath, outpath, profile, offsetms, stream, stats, _WORKER_CACHE, _WORKER_STORE)
+    except Exception:
+        import traceback
+        stats.error = traceback.format_exc()
+        print(stats.error)
+    finally:
+        closeLogfile()
+        setConsole(True)
+        if timing:
+            stats.profile = getProfile().to_dict()
+            setProfile(None)
+    return stats.to_dict()
+
+
+def makeTask(inpath: Path,
+             conf: Dict,
+             outdir: Optional[Path],
+             log: bool,
+             jsonlog: bool,
+             offsetms: int,
+             stream: bool,
+             timing: Optional[str]) -> tuple:
+    """
+    :returns: arguments of cleanFile
+    """
+    outpath = mkFilepath(str((outdir or inpath.parent) / inpath.name), conf.format, '_cleaned')
+    logpath = mkFilepath(str(inpath), '.txt', '_log') if log else None
+    jsonlogpath = mkFilepath(str(inpath), '.jsonl', '_log') if jsonlog else None
+    return inpath, outpath, logpath, jsonlogpath, offsetms, stream, bool(timing)
+
+
+def printFileStats(prefix: str, stats: dict):
+    if stats['error']:
+        error(prefix, stats['input'])
+        print(stats['error'])
+    else:
+        print(prefix, stats['input'], '->', stats['outpath'])
+        print('\t合并', stats['merged'], '行，清理语气词', stats['ono'], '行，转换', stats['converted'], '行，时间重叠',
+              stats['overlaps'], '处，输出', stats['output'], '行，WARNING', stats['warnings'], '条')
+
+
+def printBatchSummary(results: list[dict], timing: Optional[str]):
+    succeeded = [stats for stats in results if not stats['error']]
+    print()
+    print('批量处理完成！成功', len(succeeded), '个文件，失败', len(results) - len(succeeded), '个文件。')
+    print('共合并了', sum(stats['merged'] for stats in succeeded),
+          '行文本，清理了', sum(stats['ono'] for stats in succeeded),
+          '行对白的语气词，转换了', sum(stats['converted'] for stats in succeeded),
+          '行对白的假名，存在', sum(stats['overlaps'] for stats in succeeded),
+          '处时间重叠，最终生成了', sum(stats['output'] for stats in succeeded),
+          '行对白，WARNING', sum(stats['warnings'] for stats in succeeded), '条。')
+
+    if timing:
+        total = Profile()
+        for stats in results:
+            if 'profile' in stats:
+                total.update(stats['profile'])
+        reportProfile(total, timing)
+
+
+def processBatch(files: list[Path],
+                 profile: CleaningProfile,
+                 outdir: Optional[Path],
+                 log: bool,
+                 jsonlog: bool,
+                 offsetms: int,
+                 jobs: int,
+                 stream: bool = False,
+                 timing: Optional[str] = None,
+                 cache: Optional[ResultCache] = None,
+                 store: Optional[IncrementalStore] = None) -> list[dict]:
+    """
+    timing: output format of the aggregated timings, None to disable
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _WORKER_PROFILE, _WORKER_CACHE, _WORKER_STORE
+    _WORKER_PROFILE, _WORKER_CACHE, _WORKER_STORE = profile, cache, store
+    conf = profile.conf
+    tasks = [makeTask(inpath, conf, outdir, log, jsonlog, offsetms, stream, timing) for inpath in files]
+    outpaths = [task[1] for task in tasks]
+    assert len(set(outpaths)) == len(outpaths), '批量处理的输出文件重名，请分别处理不同文件夹中的同名文件！'
+
+    jobs = max(1, min(jobs, len(tasks)))
+    print('批量处理', len(tasks), '个文件，并行进程数', jobs)
+    print()
+    results = []
+    if jobs == 1:
+        results_iter = (cleanFile(*task) for task in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_initWorker, initargs=(conf.to_dict(), cache, store))
+        results_iter = executor.map(cleanFile, *zip(*tasks))
+    try:
+        for fileid, stats in enumerate(results_iter, 1):
+            results.append(stats)
+            printFileStats(f'[{fileid}/{len(tasks)}]', stats)
+    finally:
+        if jobs > 1:
+            executor.shutdown()
+
+    printBatchSummary(results, timing)
+    return results
+
+
+def _initWatchWorker(conf_dict: dict, cache: Optional[ResultCache] = None, store: Optional[IncrementalStore] = None):
+    import signal
+
+    # Ctrl+C只由主进程处理，避免正在处理的子进程被中断
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _initWorker(conf_dict, cache, store)
+
+
+def processWatch(folders: list[Path],
+                 profile: CleaningProfile,
+                 outdir: Optional[Path],
+                 log: bool,
+                 jsonlog: bool,
+                 offsetms: int,
+                 jobs: int,
+                 stream: bool = False,
+                 timing: Optional[str] = None,
+                 interval: float = 1.0,
+                 cache: Optional[ResultCache] = None,
+                 store: Optional[IncrementalStore] = None) -> list[dict]:
+    """
+    常驻运行，监视folders并处理其中新出现（写入完成）或被修改的字幕，按Ctrl+C结束。
+    配置只在启动时编译一次，并行处理时子进程一直保留编译好的profile，不用为每个文件重新启动。
+    已有比输入文件新的输出文件时不再处理，重新启动后不会重复处理。
+    interval: seconds between two polls
+    """
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+
+    global _WORKER_PROFILE, _WORKER_CACHE, _WORKER_STORE
+    _WORKER_PROFILE, _WORKER_CACHE, _WORKER_STORE = profile, cache, store
+    conf = profile.conf
+
+    def done(inpath: Path) -> bool:
+        outpath = makeTask(inpath, conf, outdir, False, False, offsetms, stream, None)[1]
+        try:
+            return outpath.stat().st_mtime_ns >= inpath.stat().st_mtime_ns
+        except OSError:
+            return False
+
+    watcher = FolderWatcher(folders, done)
+    jobs = max(1, jobs)
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_initWatchWorker, initargs=(conf.to_dict(), cache, store))
+    queue: deque[Path] = deque()
+    running: dict[Future, Path] = {}
+    states = {}  # 正在处理的文件开始处理时的状态
+    results = []
+
+    def finish(inpath: Path, state, stats: dict):
+        """state: 开始处理时的文件状态，处理期间被修改时之后会重新处理"""
+        watcher.recheck(inpath, state)
+        results.append(stats)
+        printFileStats(f'[{len(results)}]', stats)
+
+    print('正在监视', '、'.join(str(folder) for folder in folders), '，并行进程数', jobs, '，按Ctrl+C结束')
+    print()
+    try:
+        while True:
+            # 正在处理的文件又被修改时不重复提交，处理完成后由recheck重新加入
+            queue.extend(p for p in watcher.poll() if p not in queue and p not in running.values())
+            if executor is None:
+                while queue:
+                    inpath = queue.popleft()
+                    state = watcher.state(inpath)
+                    finish(inpath, state, cleanFile(*makeTask(inpath, conf, outdir, log, jsonlog, offsetms, stream, timing)))
+                time.sleep(interval)
+                continue
+            # 同时只提交jobs个任务，其余的留在队列中
+            while queue and len(running) < jobs:
+                inpath = queue.popleft()
+                task = makeTask(inpath, conf, outdir, log, jsonlog, offsetms, stream, timing)
+                running[executor.submit(cleanFile, *task)] = inpath
+                states[inpath] = watcher.state(inpath)
+            finished, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+            for future in finished:
+                inpath = running.pop(future)
+                finish(inpath, states.pop(inpath), future.result())
+    except KeyboardInterrupt:
+        print('\n停止监视')
+        if running:
+            print('等待正在处理的', len(running), '个文件...')
+    finally:
+        if executor is not None:
+            for future in as_completed(running):
+                inpath = running[future]
+                finish(inpath, states.pop(inpath), future.result())
+            executor.shutdown()
+
+    printBatchSummary(results, timing)
+    return results
+
+
 if __name__ == '__main__':
-    global conf
+    import multiprocessing
+
+    # 打包为exe时，进程池的子进程会重新运行本程序，需要在这里转为执行子进程的任务
+    multiprocessing.freeze_support()
     parser = initparser()
     args = parser.parse_args()
-    offsetms = datetime.timedelta(milliseconds=args.offsetms)
+    offsetms = args.offsetms
+    logpath = None
+    setLevel(LEVELS[args.loglevel])
     try:
         print(DESCRIPTION)
         print()
@@ -406,39 +1128,64 @@ if __name__ == '__main__':
         conf = loadConfigs(args.config)
         print('已更新配置文件到', args.config)
         print()
+        profile = CleaningProfile.fromConf(conf, lookup)
+        cache = None if args.no_cache else ResultCache(PATHS.CACHE, args.cache_size * 1024 * 1024)
+        assert not (args.incremental and args.stream), '--incremental不能与--stream同时使用！'
+        store = IncrementalStore(PATHS.INCREMENTAL, args.cache_size * 1024 * 1024) if args.incremental else None
+
+        batch = len(args.InputFile) > 1 or not (args.InputFile and Path(args.InputFile[0]).is_file())
+        if args.watch:
+            folders = [Path(inp) for inp in args.InputFile]
+            assert folders, '请传入需要监视的文件夹！'
+            for folder in folders:
+                assert folder.is_dir(), '需要监视的文件夹不存在：' + str(folder.absolute())
+            outdir = Path(args.output) if args.output else None
+            if outdir:
+                outdir.mkdir(parents=True, exist_ok=True)
+            processWatch(folders, profile, outdir, args.log, args.jsonlog, offsetms, args.jobs, args.stream, args.profile,
+                         args.interval, cache, store)
+        elif batch:
+            files = expandInputs(args.InputFile)
+            assert files, '未找到待转换的ass文件：' + ' '.join(args.InputFile)
+            outdir = Path(args.output) if args.output else None
+            if outdir:
+                outdir.mkdir(parents=True, exist_ok=True)
+            processBatch(files, profile, outdir, args.log, args.jsonlog, offsetms, args.jobs, args.stream, args.profile, cache, store)
+        else:
+            inputfile = args.InputFile[0]
 
-        assert Path(args.InputFile).is_file(), '输入文件不存在：' + str(Path(args.InputFile).absolute())
-
-        if args.log:
-            logpath = mkFilepath(args.InputFile, '.txt', '_log')
-            setLogfile(logpath)
-
-        print('正在读取', args.InputFile)
+            if args.log:
+                logpath = mkFilepath(inputfile, '.txt', '_log')
+                setLogfile(logpath)
+            if args.jsonlog:
+                setJsonLog(mkFilepath(inputfile, '.jsonl', '_log'))
 
-        with open(args.InputFile, encoding='utf-8-sig') as f:
-            doc = ass.parse(f)
-        doc = processDoc(doc, lookup, offsetms)
+            print('正在读取', inputfile)
 
-        if args.output:
-            outpath = mkFilepath(args.output, conf.format)
-        else:
-            outpath = mkFilepath(args.InputFile, conf.format, '_cleaned')
+            if args.output:
+                outpath = mkFilepath(args.output, conf.format)
+            else:
+                outpath = mkFilepath(inputfile, conf.format, '_cleaned')
 
-        save(conf.format, doc, outpath)
-        print('\n已保存至', outpath)
-        print()
-    except AssertionError as err:
+            if args.profile:
+                setProfile(Profile())
+            cleanPath(Path(inputfile), outpath, profile, offsetms, args.stream, cache=cache, store=store, jobs=args.jobs)
+            print('\n已保存至', outpath)
+            print()
+            if args.profile:
+                reportProfile(getProfile(), args.profile)
+    except (AssertionError, ConfigError) as err:
         error(err)
     except Exception as err:
         error(
             '\n请将下面的报错信息及待转换文件提交到 https://github.com/zhimengsub/SubtitleCleaner/issues')
+        import traceback
         traceback.print_exc()
     finally:
-        if args.log:
-            closeLogfile()
+        closeLogfile()
+        if logpath:
             _print('日志文件已保存至', str(logpath))
             _print()
 
         if not args.quit:
             os.system('pause')
-
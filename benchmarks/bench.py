@@ -0,0 +1,282 @@
+"""
+性能测试：用benchmarks/corpus.py生成的字幕分别测试各处理阶段的速度（行/秒）和内存峰值，
+并与基准文件比较，速度下降超过容差时以返回值1退出。
+
+python benchmarks/bench.py                    # 测试并与benchmarks/baseline.json比较
+python benchmarks/bench.py --save-baseline    # 测试并保存为新的基准
+python benchmarks/bench.py -k merge --lines 50000
+
+基准与运行环境有关，更换机器后应重新生成。
+"""
+import argparse
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT))
+
+import ass
+
+import FullwidthConverter
+import SubCleaner
+import utils.jsonlib as json
+from benchmarks.corpus import CorpusOptions, addArguments, generate, optionsFrom
+from utils.cache import ResultCache
+from utils.cleaningprofile import CleaningProfile
+from utils.conf import loadConfigs
+from utils.const import PARALLEL_PARTS
+from utils.incremental import IncrementalStore, groupUnits, splitUnits
+from utils.logfile import setLevel, QUIET
+from utils.mergeindex import MergeIndex
+from utils.mydialogue import MyDialogue, parseDoc
+from utils.stream import AssStreamReader
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+
+
+class Bench:
+    """
+    一项测试。setup返回run的参数，不计入时间；run处理lines行。
+    """
+    def __init__(self, name: str, setup: Callable[[], tuple], run: Callable[..., object], lines: int):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.lines = lines
+
+    def measure(self, repeat: int) -> dict:
+        best = float('inf')
+        for _ in range(repeat):
+            args = self.setup()
+            # 与timeit一样，计时时关闭垃圾回收以减少波动
+            gc.collect()
+            gc.disable()
+            try:
+                t0 = time.perf_counter()
+                self.run(*args)
+                best = min(best, time.perf_counter() - t0)
+            finally:
+                gc.enable()
+
+        args = self.setup()
+        tracemalloc.start()
+        self.run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return dict(seconds=best, lines_per_sec=self.lines / best, peak_kb=peak // 1024)
+
+
+def _dialogues(doc: ass.Document) -> list[MyDialogue]:
+    return [MyDialogue(event) for event in doc.events if event.TYPE == 'Dialogue']
+
+
+def _mergeAll(profile: CleaningProfile, events: list[MyDialogue], index: MergeIndex):
+    """与processEvents相同的方式逐段合并"""
+    conf = profile.conf
+    i = 0
+    while i < len(events):
+        event = events[i]
+        if not event.text or event.style.lower() == 'rubi':
+            i += 1
+            continue
+        end, _ = SubCleaner.mergeEvents(profile, events, index, i, conf.merge.limit, i, [], [], conf.merge.ignore_limit_on_overlap)
+        i = end + 1
+
+
+def _cleanAll(profile: CleaningProfile, events: list[MyDialogue]):
+    for event in events:
+        for pats in (profile.pats_rm, profile.pats_rmpairs, profile.pats_rmcomment,
+                     profile.pats_speaker, profile.pats_prefix, profile.pats_final):
+            SubCleaner.cleanEvent(event, pats)
+
+
+def _convertAll(texts: list[str], lookup):
+    for text in texts:
+        FullwidthConverter.convertline(text, lookup)
+
+
+def makeBenches(path: Path, outdir: Path, profile: CleaningProfile) -> list[Bench]:
+    with open(path, encoding='utf-8-sig') as f:
+        content = f.read()
+    doc = parseDoc(content.splitlines(keepends=True))
+    lines = len(doc.events)
+    lookup = profile.lookup
+    texts = [event.text for event in doc.events]
+
+    def split():
+        return content.splitlines(keepends=True),
+
+    def parsed():
+        return parseDoc(content.splitlines(keepends=True)),
+
+    def indexed():
+        events = _dialogues(doc)
+        return profile, events, MergeIndex(events, profile.pairs, profile.singlesufs)
+
+    return [
+        Bench('parseDoc', split, parseDoc, lines),
+        Bench('processDoc', parsed, lambda doc: SubCleaner.processDoc(doc, profile, 0), lines),
+        Bench('mergeEvents', indexed, _mergeAll, lines),
+        Bench('cleanEvent', lambda: (profile, _dialogues(doc)), _cleanAll, lines),
+        Bench('convertline', lambda: (texts, lookup), _convertAll, lines),
+        Bench('doconvert', lambda: (path, outdir / 'doconvert.txt', lookup), FullwidthConverter.doconvert, lines),
+        Bench('doconvertBulk', lambda: (path, outdir / 'doconvert.txt', lookup), FullwidthConverter.doconvertBulk, lines),
+    ]
+
+
+def checkParallelSplit(path: Path, profile: CleaningProfile, jobs: int = 4) -> list[str]:
+    """
+    在开头附近插入一个未配对的左括号，分段并行处理（processParallel）仍应分为jobs*PARALLEL_PARTS段，
+    而不是从该括号起全部成为一个单元
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        reader = AssStreamReader(f)
+        raw = list(reader.rawEvents())
+    # 选一个右括号在字幕中从未出现的括号对
+    left = next((left for left, right in profile.pairs.items() if not any(right in line for _, line in raw)), None)
+    if left is None:
+        return []
+    i = next(i for i, (type_name, _) in enumerate(raw) if type_name == 'Dialogue')
+    raw[i] = (raw[i][0], raw[i][1] + left)
+    units = splitUnits(raw, reader.section.field_order, profile.pairs, profile.singlesufs, profile.conf.merge.time)
+    parts = groupUnits(units, jobs * PARALLEL_PARTS)
+    if len(parts) != jobs * PARALLEL_PARTS:
+        return [f'有未配对的{left}时只分为{len(parts)}段（{len(units)}个单元），应为{jobs * PARALLEL_PARTS}段']
+    return []
+
+
+def checkNegativeOffset(path: Path, tmp: Path, profile: CleaningProfile, offsetms: int = -60000) -> list[str]:
+    """
+    负数的--offsetms会使开头的时间变为负数，流式、增量和分段并行处理的输出（标注了分段和时间重叠）
+    都应与完整处理（processDoc）相同
+    """
+    folder = tmp / 'offset'
+    folder.mkdir()
+    doc = folder / 'doc.ass'
+    SubCleaner.saveDoc(SubCleaner.processDoc(SubCleaner.readDoc(path), profile, offsetms), doc, 'ass')
+    outputs = dict(stream=folder / 'stream.ass', incremental=folder / 'incremental.ass', parallel=folder / 'parallel.ass')
+    SubCleaner.processStream(path, outputs['stream'], profile, offsetms)
+    SubCleaner.processIncremental(path, outputs['incremental'], profile, offsetms, IncrementalStore(folder / 'state', 1 << 30))
+    SubCleaner.processParallel(path, outputs['parallel'], profile, offsetms, 2)
+    with open(doc, encoding='utf-8-sig') as f:
+        expected = f.read()
+    failures = []
+    for name, outpath in outputs.items():
+        with open(outpath, encoding='utf-8-sig') as f:
+            if f.read() != expected:
+                failures.append(f'--offsetms {offsetms}时{name}的输出与完整处理不同')
+    return failures
+
+
+class _CountingCache(ResultCache):
+    """每次扫描缓存目录时在目录下的scans文件中记一次，子进程中的扫描也会记录"""
+
+    def evict(self):
+        with open(self.root / 'scans', 'a', encoding='utf8') as f:
+            f.write('.')
+        super().evict()
+
+
+def checkWorkerCache(tmp: Path, profile: CleaningProfile, jobs: int = 2, files: int = 8) -> list[str]:
+    """
+    并行批量处理（processBatch）多个文件时，每个子进程共用一个结果缓存，
+    只在第一次写入时扫描一次缓存目录，之后的写入按总大小的估计判断是否需要删除
+    """
+    folder = tmp / 'batch'
+    folder.mkdir()
+    inputs = []
+    for seed in range(files):
+        inpath = folder / f'{seed}.ass'
+        with open(inpath, 'w', encoding='utf_8_sig') as f:
+            f.write(generate(CorpusOptions(lines=200, seed=seed)))
+        inputs.append(inpath)
+    cache = _CountingCache(tmp / 'cache', 1 << 30)
+    results = SubCleaner.processBatch(inputs, profile, None, False, False, 0, jobs, cache=cache)
+    failed = [stats['input'] for stats in results if stats['error']]
+    if failed:
+        return ['批量处理失败：' + '、'.join(failed)]
+    with open(tmp / 'cache' / 'scans', encoding='utf8') as f:
+        scans = len(f.read())
+    if scans > jobs:
+        return [f'{jobs}个进程处理{files}个文件时扫描了{scans}次缓存目录，应不超过{jobs}次']
+    return []
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['lines_per_sec'] / base['lines_per_sec']
+        if ratio < 1 - tolerance:
+            regressions.append(f'{name}: {result["lines_per_sec"]:.0f} 行/秒，基准为 {base["lines_per_sec"]:.0f} 行/秒（{ratio:.0%}）')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='SubtitleCleaner性能测试')
+    addArguments(parser)
+    parser.add_argument('-k', dest='only', help='只运行名称中包含该字符串的测试')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每项重复次数，取最快一次，默认为5')
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help='基准文件路径，默认为benchmarks/baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基准')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的速度下降比例，默认为0.3')
+    args = parser.parse_args()
+    opts = optionsFrom(args)
+
+    setLevel(QUIET)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # 使用默认配置，不修改项目中的配置文件
+        profile = CleaningProfile.fromConf(loadConfigs(tmp / 'configs.json'), FullwidthConverter.lookup)
+        corpus = tmp / 'corpus.ass'
+        with open(corpus, 'w', encoding='utf_8_sig') as f:
+            f.write(generate(opts))
+
+        results = {}
+        for bench in makeBenches(corpus, tmp, profile):
+            if args.only and args.only not in bench.name:
+                continue
+            result = results[bench.name] = bench.measure(args.repeat)
+            sys.stdout.write(f'{bench.name:<12} {result["lines_per_sec"]:>12.0f} 行/秒 {result["seconds"]:>8.3f} 秒 '
+                             f'{result["peak_kb"]:>8} KB\n')
+        failures = checkParallelSplit(corpus, profile)
+        for msg in failures:
+            sys.stdout.write('分段错误 ' + msg + '\n')
+        cache_failures = checkWorkerCache(tmp, profile)
+        for msg in cache_failures:
+            sys.stdout.write('缓存错误 ' + msg + '\n')
+        offset_failures = checkNegativeOffset(corpus, tmp, profile)
+        for msg in offset_failures:
+            sys.stdout.write('输出错误 ' + msg + '\n')
+        if failures or cache_failures or offset_failures:
+            return 1
+
+    if args.save_baseline:
+        baseline = dict(corpus=vars(opts), results=results)
+        with open(args.baseline, 'w', encoding='utf8') as f:
+            json.dump(baseline, f, indent=4, ensure_ascii=False)
+        sys.stdout.write(f'已保存基准到 {args.baseline}\n')
+        return 0
+
+    if not args.baseline.is_file():
+        return 0
+    with open(args.baseline, encoding='utf8') as f:
+        baseline = json.load(f)
+    if baseline['corpus'] != vars(opts):
+        sys.stdout.write('测试字幕的参数与基准不同，不进行比较\n')
+        return 0
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for msg in regressions:
+        sys.stdout.write('性能下降 ' + msg + '\n')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
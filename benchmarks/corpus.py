@@ -0,0 +1,115 @@
+"""
+生成用于性能测试的ass字幕。
+各类特殊行（括号合并、→接续、时间重叠、注音、半角片假名、特效标签）的比例可以单独设置。
+
+python benchmarks/corpus.py --lines 10000 -o corpus.ass
+"""
+import argparse
+import random
+from dataclasses import dataclass, fields
+
+HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1
+Style: Rubi,Arial,10,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+WORDS = ['こんにちは', '元気', 'ウソ', 'ダメだ', 'ホント', 'ケンカ', 'ジャマ', 'ヤツ', 'あっ', 'ん', '１２', '３', '7', '12時',
+         '　', '、', '。', '！', '？', '♪', '…']
+KATAKANA = ['ｶﾞﾝﾀﾞﾑ', 'ﾊﾟﾝ', 'ｱｲｳ', 'ﾃｽﾄ', 'ﾎﾟｹｯﾄ', '｢ﾊｲ｣', '､']
+PAIRS = [('「', '」'), ('《', '》'), ('(', ')'), ('（', '）'), ('[', ']')]
+TAGS = ['{\\an8}', '{\\an8\\c&H00FF00&}', '{\\pos(10,20)\\cHFFF}', '{\\i1}', '{\\fad(100,200)}']
+SPEAKERS = ['ハルカ：', 'カナタ：', '（ナレーション）']
+
+
+@dataclass
+class CorpusOptions:
+    lines: int = 10000
+    seed: int = 1
+    pairs: float = 0.05
+    """括号跨行的比例"""
+    chains: float = 0.05
+    """以→结尾接续下一行的比例"""
+    overlaps: float = 0.1
+    """与上一行时间重叠的比例"""
+    rubi: float = 0.03
+    """注音行的比例"""
+    katakana: float = 0.2
+    """含半角片假名的比例"""
+    tags: float = 0.1
+    """含特效标签的比例"""
+    speakers: float = 0.03
+    """含说话人的比例"""
+
+
+def _fmt(cs: int) -> str:
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f'{h}:{m:02}:{s:02}.{cs:02}'
+
+
+def generate(opts: CorpusOptions) -> str:
+    rand = random.Random(opts.seed)
+    out = [HEADER]
+    t = 100  # cs
+    pending = None  # 尚未闭合的右括号
+    for _ in range(opts.lines):
+        words = [rand.choice(WORDS) for _ in range(rand.randint(1, 5))]
+        if rand.random() < opts.katakana:
+            words.insert(rand.randrange(len(words) + 1), rand.choice(KATAKANA))
+        text = ''.join(words)
+
+        if pending:
+            # 隔几行后闭合括号
+            if rand.random() < 0.4:
+                text += pending
+                pending = None
+        elif rand.random() < opts.pairs:
+            left, pending = rand.choice(PAIRS)
+            text = left + text
+        elif rand.random() < opts.chains:
+            text += '→'
+        if rand.random() < opts.speakers:
+            text = rand.choice(SPEAKERS) + text
+        if rand.random() < opts.tags:
+            text = rand.choice(TAGS) + text
+
+        style = 'Default'
+        if rand.random() < opts.rubi:
+            style = 'Rubi'
+            text = rand.choice(KATAKANA)
+
+        dur = rand.randint(50, 400)
+        start = t
+        if rand.random() < opts.overlaps:
+            start = max(0, t - rand.randint(10, 80))
+        out.append(f'Dialogue: 0,{_fmt(start)},{_fmt(start + dur)},{style},,0,0,0,,{text}\n')
+        t = max(t, start + dur + rand.randint(0, 50))
+    return ''.join(out)
+
+
+def addArguments(parser: argparse.ArgumentParser):
+    for field in fields(CorpusOptions):
+        parser.add_argument('--' + field.name, type=field.type, default=field.default, help=f'默认为{field.default}')
+
+
+def optionsFrom(args: argparse.Namespace) -> CorpusOptions:
+    return CorpusOptions(**{field.name: getattr(args, field.name) for field in fields(CorpusOptions)})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成用于性能测试的ass字幕')
+    addArguments(parser)
+    parser.add_argument('-o', '--output', required=True, help='输出文件路径')
+    args = parser.parse_args()
+    with open(args.output, 'w', encoding='utf_8_sig') as f:
+        f.write(generate(optionsFrom(args)))
@@ -0,0 +1,163 @@
+"""
+启动耗时测试：在新的解释器中以`-X importtime`运行各入口的导入或一次简单的处理，
+统计导入耗时（不含解释器本身启动时导入的模块）和总耗时，
+并检查各路径没有导入不需要的重量级模块。
+
+导入了不应导入的模块，或导入耗时比基准慢超过容差时以返回值1退出。
+
+python benchmarks/startup.py                    # 测试并与benchmarks/startup_baseline.json比较
+python benchmarks/startup.py --save-baseline    # 测试并保存为新的基准
+python benchmarks/startup.py -v                 # 同时列出每项自身导入耗时最多的模块
+
+基准与运行环境有关，更换机器后应重新生成。
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT = Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT))
+
+import utils.jsonlib as json
+from benchmarks.corpus import CorpusOptions, generate
+
+BASELINE = Path(__file__).parent / 'startup_baseline.json'
+
+
+class Case(NamedTuple):
+    name: str
+    code: str
+    """在ROOT下运行的代码，{tmp}替换为临时文件夹"""
+    forbidden: tuple[str, ...]
+    """该路径不应导入的模块"""
+
+
+CASES = [
+    Case('FullwidthConverter', 'import FullwidthConverter',
+         ('ass', 'ass_tag_parser', 'addict', 'bidict', 'orjson', 'ujson', 'multiprocessing')),
+    Case('SubCleaner', 'import SubCleaner',
+         ('ass_tag_parser', 'orjson', 'ujson', 'multiprocessing', 'concurrent.futures', 'tempfile')),
+    # 不含特效标签、输出txt的一次完整处理
+    Case('SubCleaner txt', '''
+from pathlib import Path
+import SubCleaner
+from utils.logfile import setLevel, QUIET
+setLevel(QUIET)
+tmp = Path(r'{tmp}')
+conf = SubCleaner.loadConfigs(tmp / 'configs.json')
+conf.format = 'txt'
+profile = SubCleaner.CleaningProfile.fromConf(conf, SubCleaner.lookup)
+doc = SubCleaner.cleanDocument(SubCleaner.readDoc(tmp / 'plain.ass'), profile)
+SubCleaner.saveDoc(doc, tmp / 'plain.txt', 'txt')
+''', ('ass_tag_parser', 'orjson', 'multiprocessing', 'concurrent.futures')),
+]
+
+
+def parseImportTime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    :returns: (module, level, self us, cumulative us) of each line of `-X importtime`
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_us, cumulative, name = line.split('|')
+        name = name[1:]
+        level = (len(name) - len(name.lstrip(' '))) // 2
+        imports.append((name.strip(), level, int(self_us.split(':')[1]), int(cumulative)))
+    return imports
+
+
+def runOnce(code: str) -> tuple[float, list[tuple[str, int, int, int]]]:
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                          capture_output=True, text=True, encoding='utf8')
+    seconds = time.perf_counter() - t0
+    assert proc.returncode == 0, proc.stderr
+    return seconds, parseImportTime(proc.stderr)
+
+
+def measure(case: Case, tmp: Path, interpreter: set[str], repeat: int) -> dict:
+    code = case.code.format(tmp=tmp)
+    best_wall = best_import = float('inf')
+    slowest = []
+    modules = set()
+    for _ in range(repeat):
+        seconds, imports = runOnce(code)
+        modules = {name for name, *_ in imports}
+        # 只统计解释器启动之后的导入
+        imports = [item for item in imports if item[0] not in interpreter]
+        total = sum(us for _, level, _, us in imports if level == 0) / 1000
+        best_wall = min(best_wall, seconds * 1000)
+        if total < best_import:
+            best_import = total
+            slowest = sorted(imports, key=lambda item: -item[2])[:5]
+    return dict(
+        import_ms=round(best_import, 1),
+        wall_ms=round(best_wall, 1),
+        slowest=[f'{name} {self_us / 1000:.1f}ms' for name, _, self_us, _ in slowest],
+        unexpected=sorted(set(case.forbidden) & modules),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='SubtitleCleaner启动耗时测试')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每项重复次数，取最快一次，默认为5')
+    parser.add_argument('-v', '--verbose', action='store_true', help='列出每项自身导入耗时最多的模块')
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help='基准文件路径，默认为benchmarks/startup_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基准')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的导入耗时增加比例，默认为0.3')
+    args = parser.parse_args()
+
+    # 解释器本身启动时导入的模块，以及启动的总耗时
+    runOnce('pass')
+    interpreter_wall = min(runOnce('pass')[0] for _ in range(args.repeat)) * 1000
+    interpreter = {name for name, *_ in runOnce('pass')[1]}
+    sys.stdout.write(f'{"python -c pass":<20} {"":>10}    {interpreter_wall:>8.1f} ms\n')
+
+    failed = False
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        with open(tmp / 'plain.ass', 'w', encoding='utf_8_sig') as f:
+            f.write(generate(CorpusOptions(lines=200, tags=0)))
+        for case in CASES:
+            # 第一次运行会编译pyc，不计入结果
+            runOnce(case.code.format(tmp=tmp))
+            result = results[case.name] = measure(case, tmp, interpreter, args.repeat)
+            sys.stdout.write(f'{case.name:<20} 导入 {result["import_ms"]:>8.1f} ms  总计 {result["wall_ms"]:>8.1f} ms\n')
+            if args.verbose:
+                for line in result['slowest']:
+                    sys.stdout.write(f'    {line}\n')
+            if result['unexpected']:
+                failed = True
+                sys.stdout.write(f'    导入了不应导入的模块: {", ".join(result["unexpected"])}\n')
+
+    if args.save_baseline:
+        baseline = {name: dict(import_ms=result['import_ms'], wall_ms=result['wall_ms'])
+                    for name, result in results.items()}
+        with open(args.baseline, 'w', encoding='utf8') as f:
+            json.dump(baseline, f, indent=4, ensure_ascii=False)
+        sys.stdout.write(f'已保存基准到 {args.baseline}\n')
+        return 1 if failed else 0
+
+    if args.baseline.is_file():
+        with open(args.baseline, encoding='utf8') as f:
+            baseline = json.load(f)
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            ratio = result['import_ms'] / base['import_ms']
+            if ratio > 1 + args.tolerance:
+                failed = True
+                sys.stdout.write(f'启动变慢 {name}: 导入 {result["import_ms"]:.1f} ms，基准为 {base["import_ms"]:.1f} ms（{ratio:.0%}）\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import re
+from typing import NamedTuple
+
+TEXT = 0
+BLOCK = 1
+DRAWING = 2
+
+pat_block = re.compile(r'\{[^}]*\}')
+'''特效标签块，与libass一样到第一个右花括号为止，块中的左花括号不单独处理'''
+pat_drawing = re.compile(r'\\p(\d+)')
+
+
+class TagSegment(NamedTuple):
+    text: str
+    kind: int
+    """TEXT: 文本；BLOCK: 带花括号的特效标签块；DRAWING: 绘图模式（\\p大于0）下的绘图指令"""
+
+
+def lexTags(text: str) -> list[TagSegment]:
+    """
+    一次扫描把对白切分为文本、特效标签块和绘图指令，拼接各段即为原文。
+    不解析标签的参数，格式错误的标签（如不符合&Hxxxxxx&的颜色）也可以正常切分；
+    没有对应右花括号的左花括号、单独的右花括号都作为文本。
+    """
+    segments = []
+    drawing = False
+    pos = 0
+    for m in pat_block.finditer(text):
+        if m.start() > pos:
+            segments.append(TagSegment(text[pos:m.start()], DRAWING if drawing else TEXT))
+        block = m[0]
+        segments.append(TagSegment(block, BLOCK))
+        if '\\p' in block:
+            # 直到\p0之前都是绘图模式，以块中最后一个\p为准
+            for scale in pat_drawing.findall(block):
+                drawing = int(scale) > 0
+        pos = m.end()
+    if pos < len(text):
+        segments.append(TagSegment(text[pos:], DRAWING if drawing else TEXT))
+    return segments
+
+
+def stripTags(text: str) -> str:
+    """删除特效标签块和绘图指令，只保留文本"""
+    if '{' not in text:
+        return text
+    if pat_drawing.search(text) is None:
+        # 没有绘图时只需删除所有标签块
+        return pat_block.sub('', text)
+    return ''.join(seg.text for seg in lexTags(text) if seg.kind == TEXT)
@@ -0,0 +1,126 @@
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import utils.jsonlib as json
+from utils.const import COPY_BLOCK
+from utils.logfile import warning
+from utils.misc import atomicWrite
+
+
+class ResultCache:
+    """
+    按内容寻址的处理结果缓存：键为输入文件内容和处理参数（版本、配置摘要等）的哈希，
+    值为输出文件和统计信息。总大小超过max_bytes时按最近使用时间删除最旧的结果。
+    写入先写临时文件再改名，多个进程可以同时使用同一个缓存目录。
+    """
+    EVICT_RATIO = 0.9
+    """超过上限时删除到上限的这个比例，之后的多次写入都不需要重新扫描"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        # 总大小的估计：第一次写入时扫描一次，之后加上本进程写入的大小，超过上限时才重新扫描
+        # （其他进程同时写入的部分不计入，会在下次扫描时修正）
+        self._total: Optional[int] = None
+
+    @staticmethod
+    def key(f: BinaryIO, *params: str) -> str:
+        """f: 输入文件，分块读取计算哈希，不整个读入内存"""
+        import hashlib
+        h = hashlib.sha256()
+        for block in iter(lambda: f.read(COPY_BLOCK), b''):
+            h.update(block)
+        for param in params:
+            h.update(b'\0' + param.encode('utf8'))
+        return h.hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        folder = self.root / key[:2]
+        return folder / (key + '.out'), folder / (key + '.json')
+
+    def get(self, key: str, outpath: Path) -> Optional[dict]:
+        """
+        命中时把缓存的输出写到outpath
+        :returns: cached summary, or None on miss
+        """
+        out, meta = self._paths(key)
+        try:
+            with open(meta, encoding='utf8') as f:
+                summary = json.load(f)
+            with open(out, 'rb') as fin, atomicWrite(outpath, 'wb') as fout:
+                shutil.copyfileobj(fin, fout)
+            # 更新修改时间，作为最近使用时间
+            os.utime(out)
+            os.utime(meta)
+        except (OSError, ValueError):
+            return None
+        return summary
+
+    def put(self, key: str, outpath: Path, summary: dict):
+        """
+        缓存outpath和统计信息。
+        缓存目录无法写入（如只读、被同名文件占用）时只输出warning，不影响已保存的输出
+        """
+        out, meta = self._paths(key)
+        try:
+            out.parent.mkdir(parents=True, exist_ok=True)
+            self._write(out, src=outpath)
+            info = json.dumps(summary).encode('utf8')
+            self._write(meta, info)
+            if self._total is None:
+                self.evict()
+            else:
+                self._total += out.stat().st_size + len(info)
+                if self._total > self.max_bytes:
+                    self.evict()
+        except OSError as err:
+            warning('无法写入结果缓存，本次结果不会被缓存：', err)
+
+    @staticmethod
+    def _write(path: Path, data: bytes = b'', src: Optional[Path] = None):
+        """先写入临时文件再改名。src: 复制该文件，代替data"""
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if src is None:
+                    f.write(data)
+            if src is not None:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def evict(self):
+        """扫描缓存目录，总大小超过max_bytes时删除最久未使用的结果，直到不超过max_bytes*EVICT_RATIO"""
+        entries = {}
+        total = 0
+        # 只统计按键前两位分组的文件夹，同一目录下的增量处理记录（state）不计入
+        for p in self.root.glob('??/*'):
+            if p.suffix not in ('.out', '.json'):
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            total += st.st_size
+            # 输出和统计信息一起删除，按较新的一个的时间排序
+            mtime, size = entries.get(p.stem, (0, 0))
+            entries[p.stem] = (max(mtime, st.st_mtime_ns), size + st.st_size)
+        self._total = total
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * self.EVICT_RATIO
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            for p in self._paths(key):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            total -= size
+            self._total = total
+            if total <= target:
+                break
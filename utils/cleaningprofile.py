@@ -0,0 +1,104 @@
+from copy import deepcopy
+import re
+from typing import NamedTuple
+
+from addict import Dict
+from bidict import bidict
+
+import utils.patterns as patterns
+from FullwidthConverter import LookupConverter, compileLookup
+from utils.conf import ConfigError
+from utils.replacer import TextReplacer
+from utils.rules import CharRule, RuleSet, SuffixRule
+
+
+class CleaningProfile(NamedTuple):
+    """
+    由一份配置编译得到的全部清理规则和查找表，创建后不再修改。
+    处理过程中不依赖任何全局配置，同一个profile可以在多个线程中、多次处理之间共享，
+    不同的配置（如每部番剧各自的配置）使用各自的profile即可。
+    """
+    conf: Dict
+    """配置的副本，不要修改"""
+    pairs: bidict
+    """标志台词需要合并的符号对，如{'《': '》'}"""
+    singlesufs: tuple[str, ...]
+    """标志以该符号结尾时与下一句台词合并，如 ('→', '➡')"""
+    texts_replace: TextReplacer
+    """文本替换，见TextReplacer"""
+    lookup: LookupConverter
+    pat_ono: re.Pattern
+    """清理语气词，见patterns.onoPattern"""
+    pats_rm: RuleSet
+    pats_rmcomment: RuleSet
+    pats_rmpairs: RuleSet
+    pats_prefix: RuleSet
+    pats_speaker: RuleSet
+    pats_final: RuleSet
+
+    def fingerprint(self) -> str:
+        """配置的摘要，与配置文件中键的顺序和格式无关，用于结果缓存"""
+        import hashlib
+        import json
+        text = json.dumps(self.conf.to_dict(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+    @classmethod
+    def fromConf(cls, conf: Dict, lookup: dict) -> 'CleaningProfile':
+        """
+        conf: loadConfigs得到的配置
+        lookup: 假名转换查找表，见FullwidthConverter.lookup
+        """
+        conf = deepcopy(conf)
+        conf.freeze()
+        rules_rm = list(patterns.pats_rm)
+        # 删除符号
+        if conf.symbols.remove != '':
+            rules_rm.append(CharRule.remove(conf.symbols.remove))
+        # 替换符号
+        if conf.symbols.replace_key != '' and conf.symbols.replace_val != '':
+            assert len(conf.symbols.replace_key) == len(conf.symbols.replace_val),\
+                'symbols.replace_key的个数与symbols.replace_val的个数不一致！'
+            rules_rm.extend(
+                CharRule({string: repl})
+                for string, repl in
+                zip(conf.symbols.replace_key, conf.symbols.replace_val)
+            )
+        # 替换文本
+        texts_replace = {}
+        if conf.texts:
+            for key, val in conf.texts.replace.items():
+                key = key.strip()
+                val = val.strip()
+                texts_replace[key] = val
+
+        # 清理语气词
+        # 单个字符串也可以迭代，会把每个字符当作一个语气词；不用assert，-O运行时也要检查
+        if not isinstance(conf.ono_words, list) or not all(isinstance(word, str) for word in conf.ono_words):
+            raise ConfigError('ono_words应为字符串的列表！')
+
+        # 标志合并的符号对
+        pairs = bidict()
+        if conf.merge.merge_pairs_left != '' and conf.merge.merge_pairs_right != '':
+            assert len(conf.merge.merge_pairs_left) == len(conf.merge.merge_pairs_right), \
+                'symbols.merge_pairs_left的个数与symbols.merge_pairs_right的个数不一致！'
+            pairs.putall(zip(conf.merge.merge_pairs_left, conf.merge.merge_pairs_right))
+        # 标志合并的后缀符号
+        singlesufs = tuple(str(conf.merge.merge_suffix))
+        # 删除结尾单符号合并标志
+        rules_rm.extend(SuffixRule(c) for c in singlesufs)
+
+        return cls(
+            conf=conf,
+            pairs=pairs,
+            singlesufs=singlesufs,
+            texts_replace=TextReplacer(texts_replace),
+            lookup=compileLookup(lookup),
+            pat_ono=patterns.onoPattern(word.strip() for word in conf.ono_words),
+            pats_rm=RuleSet(rules_rm, name='pats_rm'),
+            pats_rmcomment=patterns.pats_rmcomment,
+            pats_rmpairs=patterns.pats_rmpairs,
+            pats_prefix=patterns.pats_prefix,
+            pats_speaker=patterns.pats_speaker,
+            pats_final=patterns.pats_final,
+        )
@@ -1,10 +1,12 @@
 from pathlib import Path
-from typing import Optional
 
 from addict import Dict
 
 import utils.jsonlib as json
-from utils.patterns import load_patterns_from_conf
+
+
+class ConfigError(ValueError):
+    """配置文件中的配置项不正确，由入口直接输出错误信息，不需要提交bug"""
 
 
 def update_from(base: dict, new: dict):
@@ -65,6 +67,10 @@ def loadConfigs(path: Path) -> Dict:
         remove_format_tags=True,
         # remove_comments: remove (...) format
         remove_comments=True,
+        # 清理语气词 see patterns.onoPattern
+        remove_ono=False,
+        # 额外的语气词，原样匹配
+        ono_words=[],
         # remove speaker name, 规则为从行首开始全是片假名，跟一个冒号。如果说话人在句中则处理不了 see pats_speaker
         remove_speaker=True,
         convert_width=True,
@@ -85,7 +91,6 @@ def loadConfigs(path: Path) -> Dict:
     else:
         path.touch()
     saveConfigs(path, conf)
-    load_patterns_from_conf(conf)
     return conf
 
 
@@ -93,5 +98,3 @@ def saveConfigs(path: Path, conf: Dict):
     with path.open('w', encoding='utf8') as f:
         json.dump(conf.to_dict(), f, indent=4, ensure_ascii=False)
 
-
-conf: Optional[Dict] = None
@@ -1,5 +1,6 @@
 import re
 import sys
+from datetime import timedelta
 from pathlib import Path
 
 from addict import Dict
@@ -12,17 +13,38 @@ ROOT = Path(sys.executable).parent if ISEXE else Path(__file__).parents[1]
 
 PATHS = Dict(
     CONF=ROOT / 'configs.json',  # 配置文件
+    CACHE=ROOT / 'cache',  # 处理结果缓存
+    INCREMENTAL=ROOT / 'cache' / 'state',  # 增量处理的记录
 )
 
+OUTPUT_VER = 2
+'''
+处理结果的版本，与程序版本VER无关。任何可能改变输出的修改（如文本替换、特效标签的处理）都应加一，
+使结果缓存和增量处理的记录失效，不会继续使用旧版本的结果
+'''
+
 # 一句话只有一位数字时改为全角
 to_fullwidth = {'1': '１', '2': '２', '3': '３', '4': '４', '5': '５',
                 '6': '６', '7': '７', '8': '８', '9': '９', '0': '０'}
 to_halfwidth = {v: k for k, v in to_fullwidth.items()}
-pat_single_digit = (re.compile(r'(?<!\d)\d(?!\d)'), lambda x: to_fullwidth.get(x.group(), x.group()))
-pat_multi_digit = (re.compile(r'\d{2,}'), lambda x: ''.join(to_halfwidth.get(c, c) for c in x))
+table_halfwidth = str.maketrans(to_halfwidth)
+pat_digit = re.compile(r'\d')
+'''任意Unicode数字，与str.isdecimal()一致'''
+
+MS = timedelta(milliseconds=1)
 
 MERGE_SEP = '░'
-MERGE_SEP_ON_OVERLAP = '▒'
 MERGE_SEP_ON_SPECIAL_PREFIX = '▓'
-OVERLAPPED_CHUNK_PREFIX = '█'
-'''mark a chunk as overlapped by adding this prefix, for spliiting again'''
+
+STREAM_CHUNK = 256
+'''流式处理时每段至少包含的事件数'''
+STREAM_WINDOW = 10000
+'''流式处理时一段最多包含的事件数，超过时强制切分'''
+
+COPY_BLOCK = 1 << 20
+'''分块读取文件（计算哈希等）时每块的字节数'''
+
+PARALLEL_MIN_SIZE = 4 << 20
+'''处理单个文件时，文件达到该大小（字节）才分段并行处理，较小的文件启动进程的开销大于收益'''
+PARALLEL_PARTS = 4
+'''分段并行处理时平均每个进程分到的段数，分得更细可以减少各进程负载不均'''
@@ -0,0 +1,154 @@
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import utils.jsonlib as json
+from utils.mydialogue import plain_text
+from utils.stream import MergeBoundary
+from utils.timeline import parseAssTime
+
+RAW_EVENT = tuple[str, str]
+"""事件的类型和未解析的各栏，见AssStreamReader.rawEvents"""
+
+
+def splitUnits(events: list[RAW_EVENT],
+               field_order: list[str],
+               pairs: dict[str, str],
+               singlesufs: Iterable[str],
+               merge_time: bool) -> list[list[RAW_EVENT]]:
+    """
+    在所有可以切分的位置（见MergeBoundary）切分，每个单元单独处理的结果与整体处理一致。
+    只解析判断需要的时间和文本栏，不创建事件对象。
+    之后不再出现右括号的左括号（未配对的括号）不会合并，不影响切分。
+    """
+    nsplit = len(field_order) - 1
+    i_start = field_order.index('Start')
+    i_end = field_order.index('End')
+    i_text = field_order.index('Text')
+    rows = [line.split(',', nsplit) for _, line in events]
+    last_rights = {}
+    for right in pairs.values():
+        for i in range(len(rows) - 1, -1, -1):
+            row = rows[i]
+            # 栏数不对的行在下面解析时间时报错
+            if len(row) > i_text and right in row[i_text]:
+                last_rights[right] = i
+                break
+    boundary = MergeBoundary(pairs, singlesufs, merge_time, last_rights)
+    units: list[list[RAW_EVENT]] = []
+    for event, fields in zip(events, rows):
+        type_name = event[0]
+        if boundary.check(parseAssTime(fields[i_start]), parseAssTime(fields[i_end])) or not units:
+            units.append([])
+        text = fields[i_text]
+        if type_name == 'Dialogue':
+            boundary.add(text, plain_text(text))
+        else:
+            boundary.add(text, None)
+        units[-1].append(event)
+    return units
+
+
+def groupUnits(units: list[list[RAW_EVENT]], parts: int) -> list[list[RAW_EVENT]]:
+    """把连续的单元拼接为约parts段，各段的事件数尽量接近"""
+    size = max(1, -(-sum(map(len, units)) // parts))
+    groups: list[list[RAW_EVENT]] = []
+    group: list[RAW_EVENT] = []
+    for unit in units:
+        group.extend(unit)
+        if len(group) >= size:
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+
+def unitKey(unit: list[RAW_EVENT]) -> str:
+    import hashlib
+    h = hashlib.sha1()
+    for type_name, line in unit:
+        h.update(type_name.encode('utf8'))
+        h.update(b':')
+        h.update(line.encode('utf8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def textField(line: str, field_order: list[str]) -> str:
+    """从dump_with_type的结果中取出Text栏"""
+    fields = line.partition(': ')[2].split(',', len(field_order) - 1)
+    return fields[field_order.index('Text')]
+
+
+class IncrementalStore:
+    """
+    按输出文件路径保存上次处理的记录，供下次增量处理比较。
+    记录包括处理参数（header）和每个单元的摘要、统计信息及输出。
+    总大小超过max_bytes时按最近使用时间删除最旧的记录（与ResultCache相同）。
+    """
+    EVICT_RATIO = 0.9
+    """超过上限时删除到上限的这个比例"""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None  # 总大小的估计，见ResultCache
+
+    def _path(self, outpath: Path) -> Path:
+        import hashlib
+        name = hashlib.sha1(str(Path(outpath).resolve()).encode('utf8')).hexdigest()
+        return self.root / (name + '.json')
+
+    def load(self, outpath: Path) -> Optional[dict]:
+        path = self._path(outpath)
+        try:
+            with open(path, encoding='utf8') as f:
+                state = json.load(f)
+            # 更新修改时间，作为最近使用时间
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return state
+
+    def save(self, outpath: Path, state: dict):
+        import tempfile
+        path = self._path(outpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf8') as f:
+                f.write(json.dumps(state))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self._total is None:
+            self.evict()
+        else:
+            self._total += path.stat().st_size
+            if self._total > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """扫描记录，总大小超过max_bytes时删除最久未使用的记录，直到不超过max_bytes*EVICT_RATIO"""
+        entries = []
+        for p in self.root.glob('*.json'):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, p))
+        total = self._total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * self.EVICT_RATIO
+        for _, size, p in sorted(entries):
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            self._total = total
+            if total <= target:
+                break
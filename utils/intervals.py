@@ -0,0 +1,39 @@
+from array import array
+from itertools import accumulate
+from typing import Sequence
+
+
+def timeArrays(events: Sequence) -> tuple[array, array]:
+    """把事件（或任何有start、end毫秒数的记录）的时间读入两个整数数组"""
+    return array('q', [event.start for event in events]), array('q', [event.end for event in events])
+
+
+def overlapGroups(starts: array, ends: array) -> list[list[int]]:
+    """
+    找出时间重叠的各组事件。
+    按开始时间排序后，开始时间早于之前所有事件的最晚结束时间，即与其中某个事件重叠，归入同一组，
+    因此不相邻的重叠（如一行很长的对白覆盖了之后的几行）和未按时间排序的事件也能找到。
+    :returns: 两个及以上事件组成的组，组内为按原顺序排列的下标，各组按第一个下标排序
+    """
+    n = len(starts)
+    if n < 2:
+        return []
+    order = sorted(range(n), key=starts.__getitem__)
+    sorted_starts = [starts[i] for i in order]
+    maxends = list(accumulate((ends[i] for i in order), max))
+    # 分组的边界：此前的事件都已结束
+    cuts = [k for k, start, maxend in zip(range(1, n), sorted_starts[1:], maxends) if start >= maxend]
+
+    groups = []
+    for lo, hi in zip([0] + cuts, cuts + [n]):
+        if hi - lo > 1:
+            groups.append(sorted(order[lo:hi]))
+    groups.sort(key=lambda group: group[0])
+    return groups
+
+
+def segmentStarts(n: int, segments: int) -> range:
+    """把n个事件均分为segments段，每段起始的下标，segments不在1~n之间时为空"""
+    if not 1 <= segments <= n:
+        return range(0)
+    return range(0, n, n // segments)
@@ -2,16 +2,17 @@ from datetime import datetime
 from json import JSONEncoder as _JSONEncoder
 from typing import Any
 
-import ujson
-from orjson import (
-    JSONDecodeError as _JSONDecodeError,
-    JSONEncodeError as _JSONEncodeError,
-    dumps as json_dumps,
-    loads as json_loads,
-)
+# orjson和ujson在第一次使用时才导入，只读写配置或只写日志时不必两个都导入
 
-JSONEncodeError = _JSONEncodeError
-JSONDecodeError = _JSONDecodeError
+
+def __getattr__(name: str):
+    if name == 'JSONEncodeError':
+        from orjson import JSONEncodeError
+        return JSONEncodeError
+    if name == 'JSONDecodeError':
+        from orjson import JSONDecodeError
+        return JSONDecodeError
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def _default(value: Any):
@@ -21,20 +22,24 @@ def _default(value: Any):
 
 
 def loads(*args, **kwargs) -> Any:
-    return json_loads(*args, **kwargs)
+    import orjson
+    return orjson.loads(*args, **kwargs)
 
 
 def load(*args, **kwargs) -> Any:
+    import ujson
     return ujson.load(*args, **kwargs)
 
 
 def dumps(*args, **kwargs) -> str:
-    return json_dumps(*args, default=_default, **kwargs).decode(
+    import orjson
+    return orjson.dumps(*args, default=_default, **kwargs).decode(
         encoding="utf-8"
     )
 
 
 def dump(*args, **kwargs) -> None:
+    import ujson
     return ujson.dump(*args, **kwargs)
 
 
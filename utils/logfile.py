@@ -1,24 +1,83 @@
+import utils.jsonlib as json
+
+QUIET = 0
+SUMMARY = 1
+VERBOSE = 2
+LEVELS = {'quiet': QUIET, 'summary': SUMMARY, 'verbose': VERBOSE}
+
 _LOGFILE = None
+_JSONLOG = None
+_CONSOLE = True
+_LEVEL = VERBOSE
+_BUFSIZE = 1 << 20
 _print = print
 
 
 def setLogfile(path):
     global _LOGFILE
-    _LOGFILE = open(path, 'w', encoding='utf8')
+    _LOGFILE = open(path, 'w', encoding='utf8', buffering=_BUFSIZE)
+
+
+def setJsonLog(path):
+    """逐条记录处理结果到JSON Lines文件"""
+    global _JSONLOG
+    _JSONLOG = open(path, 'w', encoding='utf8', buffering=_BUFSIZE)
 
 
 def closeLogfile():
+    global _LOGFILE, _JSONLOG
     if _LOGFILE is not None:
         _LOGFILE.close()
+        _LOGFILE = None
+    if _JSONLOG is not None:
+        _JSONLOG.close()
+        _JSONLOG = None
 
 
-def print(*args, **kwargs):
-    _print(*args, **kwargs)
+def setConsole(enabled: bool):
+    """关闭后print只写入日志文件（批量处理时子进程不向控制台输出逐行记录）"""
+    global _CONSOLE
+    _CONSOLE = enabled
+
+
+def setLevel(level: int):
+    """控制台输出级别：QUIET只输出错误，SUMMARY输出统计信息，VERBOSE输出逐行记录。日志文件总是记录全部内容"""
+    global _LEVEL
+    _LEVEL = level
+
+
+def logEnabled() -> bool:
+    """逐行记录是否有任何输出，没有时可以跳过逐行记录的格式化"""
+    return (_CONSOLE and _LEVEL >= VERBOSE) or _LOGFILE is not None
+
+
+def jsonLogEnabled() -> bool:
+    return _JSONLOG is not None
+
+
+def logJson(record: dict):
+    if _JSONLOG is not None:
+        _JSONLOG.write(json.dumps(record))
+        _JSONLOG.write('\n')
+
+
+def _output(level: int, *args, **kwargs):
+    if _CONSOLE and _LEVEL >= level:
+        _print(*args, **kwargs)
     if _LOGFILE is not None:
         _print(*args, **kwargs, file=_LOGFILE)
 
+
+def print(*args, **kwargs):
+    _output(SUMMARY, *args, **kwargs)
+
+
+def verbose(*args, **kwargs):
+    """逐行记录"""
+    _output(VERBOSE, *args, **kwargs)
+
 def warning(*args, **kwargs):
     print('WARNING:', *args, **kwargs)
 
 def error(*args, **kwargs):
-    print('ERROR:', *args, **kwargs)
\ No newline at end of file
+    _output(QUIET, 'ERROR:', *args, **kwargs)
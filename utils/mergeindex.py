@@ -0,0 +1,87 @@
+from array import array
+from typing import Optional
+
+from utils.mydialogue import DIALOGUE, MyDialogue
+from utils.timeline import toMs
+
+
+class MergeIndex:
+    """
+    对doc.events的一次性预索引，使合并查找每次为O(1)。
+    索引基于原始文本，合并时只会修改已处理过的对白，因此处理过程中索引始终有效。
+    """
+    def __init__(self, events: list[DIALOGUE], pairs: dict[str, str], singlesufs: list[str]):
+        n = len(events)
+        self.events = events
+        self.pairs = pairs
+        self.singlesufs = singlesufs
+        # 每行按pairs顺序第一个出现的左括号，没有则为''，无法解析特效标签则为None
+        self.lefts: list[Optional[str]] = [''] * n
+        # 每行按singlesufs顺序第一个匹配的结尾符号，没有则为''，无法解析特效标签则为None
+        self.sufs: list[Optional[str]] = [''] * n
+        # 每行的整数毫秒时间，包括非对白行
+        self.starts = array('q', [toMs(event.start) for event in events])
+        self.ends = array('q', [toMs(event.end) for event in events])
+        # 每个右括号出现的行号
+        occurrences: dict[str, list[int]] = {right: [] for right in pairs.values()}
+
+        for i, event in enumerate(events):
+            text = event.text
+            if isinstance(event, MyDialogue):
+                try:
+                    self.lefts[i], self.sufs[i] = self._startSymbols(event)
+                except Exception:
+                    # 跳过的行（如rubi）不应因此报错，真正作为合并起点时再抛出
+                    self.lefts[i] = self.sufs[i] = None
+            for right, lines in occurrences.items():
+                if right in text:
+                    lines.append(i)
+
+        # 每个右括号从第i行起下一次出现的行号，-1表示之后不再出现
+        self.next_rights: dict[str, list[int]] = {}
+        for right, lines in occurrences.items():
+            if not lines:
+                continue
+            lines = set(lines)
+            nxt = [-1] * n
+            k = -1
+            for i in range(n - 1, -1, -1):
+                if i in lines:
+                    k = i
+                nxt[i] = k
+            self.next_rights[right] = nxt
+
+    def _startSymbols(self, event: MyDialogue) -> tuple[str, str]:
+        plain = event.plain_text
+        left = next((left for left in self.pairs if left in plain), '')
+        suf = next((suf for suf in self.singlesufs if plain.endswith(suf)), '')
+        return left, suf
+
+    def left(self, i: int) -> str:
+        if self.lefts[i] is None:
+            return self._startSymbols(self.events[i])[0]
+        return self.lefts[i]
+
+    def suf(self, i: int) -> str:
+        if self.sufs[i] is None:
+            return self._startSymbols(self.events[i])[1]
+        return self.sufs[i]
+
+    def overlapEnd(self, start: int) -> int:
+        """
+        从第start行起连续时间重叠的最后一行。
+        每行只要与之前任意一行重叠即可（按最早开始、最晚结束时间判断），因此一行很长的对白覆盖之后几行时也会全部包括在内。
+        """
+        starts, ends = self.starts, self.ends
+        minstart, maxend = starts[start], ends[start]
+        j = start + 1
+        while j < len(starts) and starts[j] < maxend and ends[j] > minstart:
+            minstart = min(minstart, starts[j])
+            maxend = max(maxend, ends[j])
+            j += 1
+        return j - 1
+
+    def nextRight(self, right: str, start: int) -> int:
+        """从第start行起第一个包含right的行号，不存在则返回-1"""
+        nxt = self.next_rights.get(right)
+        return -1 if nxt is None else nxt[start]
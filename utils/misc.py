@@ -1,14 +1,11 @@
-import datetime
-import re
-from functools import reduce
+import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Literal
+from typing import IO, TYPE_CHECKING, Iterator, Literal, Optional
 
-import ass
-
-from utils.mergetype import MergeType
-from utils.patterns import pairs
-from utils.mydialogue import MyDialogue, DIALOGUE
+if TYPE_CHECKING:
+    # 只用于类型标注，FullwidthConverter等只需要mkFilepath时不必导入ass
+    import ass
 
 
 def mkFilepath(infile: str, filesuf: str, namesuf='') -> Path:
@@ -18,102 +15,34 @@ def mkFilepath(infile: str, filesuf: str, namesuf='') -> Path:
     return p
 
 
-def remove_tags(event: MyDialogue) -> MyDialogue:
-    event.text = event.plain_text
-    return event
-
-
-def overlaps(e1: DIALOGUE, e2: DIALOGUE) -> bool:
-    return e1.end > e2.start and e2.end > e1.start
-
-
-def extendEvent(
-    e1: MyDialogue,
-    e2: MyDialogue,
-    sep: str,
-    sep_on_overlap: str,
-    special_prefix: str,
-    sep_on_special_prefix: str,
-    *,
-    ignore_sep_on_pairs=True,
-) -> MyDialogue:
-    """ignore_sep_on_pairs: do not add sep after left symbol / before end symbol, i.e. `[text]` not `[ text ]`"""
-    if e2.text:
-        # extend end time
-        e1.end = e2.end
-        # extend text
-        real_sep: str
-        if (
-            ignore_sep_on_pairs and
-            any(e1.text.endswith(left) or e2.text.startswith(right) for left, right in pairs.items())
-        ):
-            # do not add sep inside pairs, i.e. `[text]` not `[ text ]`
-            real_sep = ''
-        elif special_prefix and e2.plain_text.startswith(special_prefix):
-            real_sep = sep_on_special_prefix
-        elif e2.mergetype == MergeType.Time:
-            real_sep = sep_on_overlap
-        else:
-            real_sep = sep
-
-        e1.text = e1.text + real_sep + e2.text
-    return e1
-
-
-def joinEvents(
-    events: list[MyDialogue],
-    sep: str,
-    sep_on_overlap: str,
-    *,
-    special_prefix: str = '',
-    sep_on_special_prefix: str = '',
-    ignore_sep_on_pairs: bool,
-) -> MyDialogue:
-    joined = reduce(
-        lambda e1, e2: extendEvent(
-            e1, e2, sep,
-            sep_on_overlap,
-            special_prefix,
-            sep_on_special_prefix,
-            ignore_sep_on_pairs=ignore_sep_on_pairs,
-        ), events)
-    return joined
-
-
-def splitEvents(
-    event: MyDialogue,
-    sep: str,
-    sep_on_overlap: str,
-    overlapped_chunk_prefix: str,
-) -> list[MyDialogue]:
-    # mark a chunk as overlapped, used to restore the mergetype
-    text = event.text.replace(sep_on_overlap, sep_on_overlap + overlapped_chunk_prefix)
-    events = []
-    splited_texts = re.split(sep + '|' + sep_on_overlap, text)
-    for chunk in splited_texts:
-        mergetype = MergeType.Time if chunk.startswith(overlapped_chunk_prefix) else MergeType.No
-        event = MyDialogue(event, mergetype)
-
-        chunk = chunk.replace(overlapped_chunk_prefix, '')
-        event.text = chunk
-        events.append(event)
-    return events
-
-
-def save(format: Literal['ass', 'txt'], doc: ass.Document, filepath: Path):
+@contextmanager
+def atomicWrite(path: Path, mode: str = 'w', encoding: Optional[str] = None) -> Iterator[IO]:
+    """
+    先写入同目录下的path.tmp，完成后再改名为path。
+    处理中断时不会留下不完整的输出（监视文件夹时会被当作已处理的文件）
+    """
+    tmp = Path(path).with_name(Path(path).name + '.tmp')
+    try:
+        with open(tmp, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def save(format: Literal['ass', 'txt'], doc: 'ass.Document', filepath: Path):
     if format == 'ass':
-        with open(filepath, 'w', encoding='utf_8_sig') as f:
+        with atomicWrite(filepath, encoding='utf_8_sig') as f:
             doc.dump_file(f)
     elif format == 'txt':
-        with open(filepath, 'w', encoding='utf8') as f:
+        with atomicWrite(filepath, encoding='utf8') as f:
             for event in doc.events:
                 if event.TYPE == 'Dialogue':
                     f.write(event.text)
                     f.write('\n')
     else:
         raise NotImplementedError('不支持的输出文件格式: ' + format)
-
-
-def formatDelta(delta: datetime.timedelta) -> str:
-    formatted = (datetime.datetime.min + delta).strftime('%H:%M:%S.%f')[:-3]
-    return formatted
@@ -1,32 +1,155 @@
-import re
-from typing import Union
+from typing import NamedTuple, Union
 
+import ass
 from ass import Dialogue
-from ass_tag_parser import parse_ass, AssText
+from ass.data import _Field, _parse_int_header
+from ass.section import EventsSection
+from utils.asstags import stripTags
 from utils.mergetype import MergeType
+from utils.timeline import toMs, formatAssTime, parseAssTime
 
 DIALOGUE = Union[Dialogue, 'MyDialogue']
 
+_TIME_FIELDS = ('Start', 'End')
+_INT_FIELDS = ('Layer', 'MarginL', 'MarginR', 'MarginV')
+
+
+def _dumpInt(v) -> str:
+    if type(v) is str:
+        # 未解析的原文，已经是规范的整数写法时原样输出，否则与ass库一样解析后输出
+        if v.isascii() and v.isdigit() and (v[0] != '0' or len(v) == 1):
+            return v
+        return str(_parse_int_header(v))
+    return _Field.dump(v)
+
+
+_DUMPERS = dict.fromkeys(_TIME_FIELDS, formatAssTime) | dict.fromkeys(_INT_FIELDS, _dumpInt)
+
+
+def _intField(name: str) -> property:
+    """整数栏在第一次读取时才解析"""
+    def getter(self) -> int:
+        v = self.fields.get(name, 0)
+        if type(v) is str:
+            v = self.fields[name] = _parse_int_header(v)
+        return v
+
+    def setter(self, v: int):
+        self.fields[name] = v
+
+    return property(getter, setter)
+
 
 class MyDialogue(Dialogue):
+    """
+    start和end为整数毫秒，只在输出（dump）时转换回ass的时间格式。
+    由parse创建时，Layer和Margin等整数栏保留原文，读取时才解析，没有读取过的按原文输出（见_dumpInt）。
+    """
+    _plain_text = None
+    _defaults = {f.name: f.default for f in Dialogue._field_defs}
+
     def __init__(self, event: DIALOGUE, mergetype: MergeType = MergeType.No):
-        super().__init__(**event.fields)
+        if event.fields.keys() <= self._defaults.keys():
+            # 与Dialogue.__init__(**event.fields)结果相同，省去逐个字段的setattr
+            self.fields = {**self._defaults, **event.fields}
+        else:
+            super().__init__(**event.fields)
+        fields = self.fields
+        fields['Start'] = toMs(fields['Start'])
+        fields['End'] = toMs(fields['End'])
         self.mergetype = mergetype
 
+    @classmethod
+    def parse(cls, type_name: str, line: str, field_order=None) -> 'MyDialogue':
+        """
+        代替Dialogue.parse，结果与MyDialogue(Dialogue.parse(...))相同。
+        只切分一次，只解析时间，文本栏本来就是原文，整数栏延迟解析，不创建中间的Dialogue
+        """
+        if field_order is None:
+            field_order = cls.DEFAULT_FIELD_ORDER
+        parts = line.split(',', len(field_order) - 1)
+        if len(parts) != len(field_order):
+            raise ValueError('arity of line does not match arity of field order')
+        self = cls.__new__(cls)
+        self.fields = fields = {**cls._defaults, **dict(zip(field_order, parts))}
+        for field in _TIME_FIELDS:
+            t = fields[field]
+            fields[field] = parseAssTime(t) if type(t) is str else toMs(t)
+        self.mergetype = MergeType.No
+        return self
+
+    layer = _intField('Layer')
+    margin_l = _intField('MarginL')
+    margin_r = _intField('MarginR')
+    margin_v = _intField('MarginV')
+
     @property
-    def plain_text(self):
-        return removed_tags(removed_color(self.text))
+    def start(self) -> int:
+        return self.fields['Start']
+
+    @start.setter
+    def start(self, ms: int):
+        self.fields['Start'] = ms
+
+    @property
+    def end(self) -> int:
+        return self.fields['End']
+
+    @end.setter
+    def end(self, ms: int):
+        self.fields['End'] = ms
+
+    def dump(self, field_order=None):
+        if field_order is None:
+            field_order = self.DEFAULT_FIELD_ORDER
+        fields = self.fields
+        dumpers = _DUMPERS
+        return ','.join(dumpers.get(field, _Field.dump)(fields[field]) for field in field_order)
+
+    @property
+    def text(self) -> str:
+        return self.fields.get('Text', '')
+
+    @text.setter
+    def text(self, text: str):
+        self.fields['Text'] = text
+        self._plain_text = None
+
+    @property
+    def plain_text(self) -> str:
+        '''缓存去除特效标签后的文本，修改text时失效'''
+        if self._plain_text is None:
+            self._plain_text = plain_text(self.text)
+        return self._plain_text
+
+
+class OriginalEvent(NamedTuple):
+    """处理前的对白，仅用于输出日志"""
+    start: int  # ms
+    end: int  # ms
+    text: str
+
+    @classmethod
+    def of(cls, event: DIALOGUE) -> 'OriginalEvent':
+        return cls(toMs(event.start), toMs(event.end), event.text)
+
+
+class MyEventsSection(EventsSection):
+    """对白直接解析为MyDialogue，其他事件仍由ass库解析"""
+    line_parsers = {**EventsSection.line_parsers, 'dialogue': MyDialogue}
 
 
-def removed_color(text: str) -> str:
-    '''当`\$c`特效不符合&Hxxxxxx&格式时，ass_tag_parser.parse_ass会报错，因此提前删掉这类特效'''
-    text = re.sub(r'\\[1-4]?c[&Hh0-9a-fA-F]+?([\\}])', r'\1', text)
-    return text
+class MyDocument(ass.Document):
+    """与ass.Document相同，[Events]段为MyEventsSection"""
+    SECTIONS = type(ass.Document.SECTIONS)(ass.Document.SECTIONS)
+    SECTIONS[ass.Document.EVENTS_HEADER] = MyEventsSection
 
 
-def removed_tags(text: str) -> str:
-    arr = parse_ass(text)
-    texts = [a.text for a in arr if isinstance(a, AssText)]
-    return ''.join(texts)
+def parseDoc(f) -> MyDocument:
+    """代替ass.parse"""
+    return MyDocument.parse_file(f)
 
 
+def plain_text(text: str) -> str:
+    '''去除特效标签后的文本，见utils.asstags'''
+    return stripTags(text)
@@ -1,106 +1,73 @@
 import re
+from typing import Iterable
 
-from bidict import bidict
+from utils.replacer import trieRegex
+from utils.rules import RuleSet, FusedRule
 
 
-# 标志台词需要合并的符号对，如{'《': '》'}
-pairs: bidict[str, str] = bidict()
-
-# 标志以该符号结尾时与下一句台词合并，如 ['→', '➡']
-singlesufs: list[str] = []
-
-# 文本替换字典
-texts_replace: dict[str, str] = {}
-
-# 清理相关
-pats_rm: list[tuple[re.Pattern, str]] = [
-    # 删除换行
-    (re.compile(r'\\N'), ''),
+# 清理相关，与配置有关的规则见CleaningProfile，这里的规则不应在运行时修改
+pats_rm = RuleSet([
     # 双引号改为单引号（取消）
-    # (re.compile(r'『'), '「'), (re.compile(r'』'), '」'),
-    # remove [...] 非贪婪模式，防止匹配[...]xxx[...]的形式
-    (re.compile(r'\[.*?\]'), ''),
-]
-pats_rmcomment: list[tuple[re.Pattern, str]] = [
+    # CharRule({'『': '「', '』': '」'}),
+    FusedRule(
+        # 删除换行
+        (re.compile(r'\\N'), ''),
+        # remove [...] 非贪婪模式，防止匹配[...]xxx[...]的形式
+        (re.compile(r'\[.*?\]'), ''),
+    ),
+], name='pats_rm')
+pats_rmcomment = RuleSet([
     # remove (...) 非贪婪模式，防止匹配(...)xxx(...)的形式
+    # 两条规则不能合并，如`（a(b）c)`
     (re.compile(r'\(.*?\)'), ''),
     (re.compile(r'（.*?）'), ''),
-]
-pats_rmpairs: list[tuple[re.Pattern, str]] = [
+], name='pats_rmcomment')
+pats_rmpairs = RuleSet([
     # remove [...] 非贪婪模式，防止匹配[...]xxx[...]的形式
     (re.compile(r'\[.*?\]'), ''),
-]
+], name='pats_rmpairs')
 
 
-def load_patterns_from_conf(conf):
-    global pats_rm, pairs, singlesufs, texts_replace
-    # 删除符号
-    if conf.symbols.remove != '':
-        pats_rm.append(
-            (re.compile('[' + conf.symbols.remove + ']'), ''),
-        )
-    # 替换符号
-    if conf.symbols.replace_key != '' and conf.symbols.replace_val != '':
-        assert len(conf.symbols.replace_key) == len(conf.symbols.replace_val),\
-            'symbols.replace_key的个数与symbols.replace_val的个数不一致！'
-        pats_rm.extend(
-            (re.compile(string), repl)
-            for string, repl in
-            zip(conf.symbols.replace_key, conf.symbols.replace_val)
-        )
-    # 替换文本
-    if conf.texts:
-        for key, val in conf.texts.replace.items():
-            key = key.strip()
-            val = val.strip()
-            texts_replace[key] = val
-
-    # 标志合并的符号对
-    if conf.merge.merge_pairs_left != '' and conf.merge.merge_pairs_right != '':
-        assert len(conf.merge.merge_pairs_left) == len(conf.merge.merge_pairs_right), \
-            'symbols.merge_pairs_left的个数与symbols.merge_pairs_right的个数不一致！'
-        pairs.putall(zip(conf.merge.merge_pairs_left, conf.merge.merge_pairs_right))
-    # 标志合并的后缀符号
-    if conf.merge.merge_suffix != '':
-        singlesufs.extend(list(str(conf.merge.merge_suffix)))
-        # 删除结尾单符号合并标志
-        pats_rm.extend(
-            (re.compile(c + '$'), '') for c in singlesufs
-        )
-
-# 拟声词 v0.2
-mainpats = [
+# 语气词 v0.3，只清理前后为空格或行首尾的整个词，见onoPattern
+ono_words = (
     'ん',
     'うむ', 'ええ', 'わあ', 'うわ',
     'あぁ', 'はぁ', 'うわぁ',
     'んっ', 'うっ', 'よっ', 'はっ', 'ひっ', 'ほっ', 'あっ', 'えっ', 'なっ', 'わっ',
     'えへへへ',
-    'あ+?',
-    'う+?',
+)
+ono_repeats = (
+    'あ+',
+    'う+',
     'は{2,}',
     '(?:うん)+',
-]
+)
+
+
+def onoPattern(words: Iterable[str] = ()) -> re.Pattern:
+    """
+    把ono_words、额外的words（原样匹配）和ono_repeats编译为一个正则，每行只需扫描一次，替换为空即可。
+    前后都有空格的语气词清理后保留一个空格，在行首行尾的连同相邻的空格一起删除。
+    """
+    word = '(?:' + '|'.join([trieRegex((*ono_words, *words)), *ono_repeats]) + ')'
+    # 行首可能连续有多个语气词，需要一起匹配；其他位置每次匹配前面的空格和一个词，保留后面的空格
+    return re.compile(f'^{word}(?: {word})*(?: |$)| {word}(?= |$)')
 
-pats_ono: list[tuple[re.Pattern, str]] = [
-    (re.compile(r' ' + pat + r' '), ' ') for pat in mainpats  # 前后都有空格的话，清理后需保留一个空格
-] + [
-    (re.compile(r'(?:^| )' + pat + r'(?: |$)'), '') for pat in mainpats
-]
 
-pats_prefix: list[tuple[re.Pattern, str]] = [
+pats_prefix = RuleSet([
     # 添加\N
     (re.compile(r'(^|\n)'), r'\1\\N'),
-]
+], name='pats_prefix')
 
-pats_speaker: list[tuple[re.Pattern, str]] = [
+pats_speaker = RuleSet([
     # 删除说话人 规则为从行首开始全是片假名，跟一个冒号。如果说话人在句中则处理不了
     (re.compile(r'^[\u30A0-\u30FF]+：'), '')
-]
+], name='pats_speaker')
 
 # 对合并后的每一行进行处理
-pats_final: list[tuple[re.Pattern, str]] = [
+pats_final = RuleSet([
     # 多个半角空格缩至一个
     (re.compile(r' +'), ' '),
     # 删除符号后的空格
     (re.compile(r'… +'), '…')
-]
+], name='pats_final')
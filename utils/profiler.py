@@ -0,0 +1,102 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Callable, Optional
+
+PROFILE_HOOK = Callable[[str, str, float], None]
+"""hook(kind, name, seconds)，kind为'stage'或'pattern'"""
+
+_PROFILE: Optional['Profile'] = None
+_NULL = nullcontext()
+
+
+class Profile:
+    """
+    累计各处理阶段（stages）及各条清理规则（patterns）的耗时和调用次数。
+    hook会在每次计时后调用，可用于在程序中自行统计。
+    """
+    def __init__(self, hook: Optional[PROFILE_HOOK] = None):
+        self.stages: dict[str, list] = {}  # name: [calls, seconds]
+        self.patterns: dict[str, list] = {}
+        self.hook = hook
+
+    def _add(self, kind: str, table: dict, name: str, seconds: float):
+        entry = table.get(name)
+        if entry is None:
+            table[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+        if self.hook is not None:
+            self.hook(kind, name, seconds)
+
+    def addStage(self, name: str, seconds: float):
+        self._add('stage', self.stages, name, seconds)
+
+    def addPattern(self, name: str, seconds: float):
+        self._add('pattern', self.patterns, name, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.addStage(name, perf_counter() - t0)
+
+    @contextmanager
+    def pattern(self, name: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.addPattern(name, perf_counter() - t0)
+
+    def update(self, other: dict):
+        """合并另一个Profile.to_dict()的结果（批量处理时汇总各个文件）"""
+        for key in ('stages', 'patterns'):
+            table = getattr(self, key)
+            for name, (calls, seconds) in other[key].items():
+                entry = table.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+
+    def to_dict(self) -> dict:
+        return dict(stages=self.stages, patterns=self.patterns)
+
+    def report(self) -> str:
+        """按耗时从高到低排列的统计表"""
+        lines = []
+        for title, table in (('处理阶段', self.stages), ('清理规则', self.patterns)):
+            if not table:
+                continue
+            total = sum(seconds for _, seconds in table.values()) or 1
+            width = max(len(name) for name in table)
+            lines.append(f'{title:<{width}}  {"次数":>8}  {"耗时(秒)":>9}  {"占比":>6}')
+            for name, (calls, seconds) in sorted(table.items(), key=lambda item: -item[1][1]):
+                lines.append(f'{name:<{width}}  {calls:>10}  {seconds:>11.4f}  {seconds / total:>8.1%}')
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def setProfile(profile: Optional[Profile]):
+    """开启（传入Profile）或关闭（传入None）计时"""
+    global _PROFILE
+    _PROFILE = profile
+
+
+def getProfile() -> Optional[Profile]:
+    return _PROFILE
+
+
+def stage(name: str):
+    """为with语句中的处理阶段计时，未开启计时时没有额外操作"""
+    if _PROFILE is None:
+        return _NULL
+    return _PROFILE.stage(name)
+
+
+def pattern(name: str):
+    """为with语句中的一条清理规则计时（不能用RuleSet.apply执行的规则），未开启计时时没有额外操作"""
+    if _PROFILE is None:
+        return _NULL
+    return _PROFILE.pattern(name)
@@ -0,0 +1,49 @@
+import re
+from typing import Iterable
+
+
+def trieRegex(words: Iterable[str]) -> str:
+    """
+    把一组词编译为前缀树形状的正则，如['ab', 'abc', 'b']为'(?:ab(?:c)?|b)'。
+    同一层的分支首字符互不相同，正则引擎在每层最多尝试一个分支，匹配耗时与词数基本无关；
+    有更长的词时先尝试更长的，因此为最左最长匹配。空词会被忽略。
+    """
+    trie: dict = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for c in word:
+            node = node.setdefault(c, {})
+        node[''] = {}
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(c) + emit(child) for c, child in sorted(node.items()) if c]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '|'.join(alts)
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body if len(alts) == 1 else '(?:' + body + ')'
+
+    return emit(trie)
+
+
+class TextReplacer:
+    """
+    多个文本的替换，一次扫描完成。
+    从左到右查找，同一位置有多个键时替换最长的，替换后的文本不再参与查找，结果与键的顺序无关。
+    与按顺序逐个str.replace的结果只在键互相重叠（如同时有ab和bc），或替换后的文本与前后文本组成另一个键时不同。
+    """
+    def __init__(self, mapping: dict[str, str]):
+        self.mapping = {key: val for key, val in mapping.items() if key}
+        self.pat = re.compile(trieRegex(self.mapping)) if self.mapping else None
+
+    def replace(self, text: str) -> str:
+        if self.pat is None:
+            return text
+        mapping = self.mapping
+        return self.pat.sub(lambda m: mapping[m[0]], text)
+
+    def __len__(self):
+        return len(self.mapping)
@@ -0,0 +1,148 @@
+import re
+from functools import partial
+from time import perf_counter
+from typing import Callable, Optional, Union
+
+from utils.profiler import Profile
+
+
+class CharRule:
+    """单字符删除/替换规则，相邻的CharRule会合并为一个字符表，见_translate"""
+    def __init__(self, mapping: dict[str, str]):
+        assert all(len(c) == 1 for c in mapping), 'CharRule的键必须是单个字符！'
+        self.table = str.maketrans(mapping)
+
+    @classmethod
+    def remove(cls, chars: str) -> 'CharRule':
+        return cls(dict.fromkeys(chars, ''))
+
+
+class SuffixRule:
+    """删除结尾的单个字符，等价于(re.compile(re.escape(char) + '$'), '')"""
+    def __init__(self, char: str):
+        self.char = char
+
+
+class FusedRule:
+    """
+    将多条互不影响的正则规则合并为一个分支正则，一次扫描，替换内容不同时通过回调按命中的分支替换。
+    仅当依次执行与最左匹配的结果一致时才可合并，由规则表的作者保证。
+    注意回调的开销通常大于多扫描一遍，替换内容不同的规则一般不值得合并。
+    """
+    def __init__(self, *pats: tuple[re.Pattern, str]):
+        for pat, repl in pats:
+            assert pat.groups == 0 and '\\' not in repl, '合并的正则规则不能包含分组及分组引用！'
+        self.pats = pats
+        self.repls = [repl for _, repl in pats]
+        if len(set(self.repls)) == 1:
+            # 替换内容相同时不需要分组和回调
+            self.pat = re.compile('|'.join('(?:' + pat.pattern + ')' for pat, _ in pats))
+            self.repl = self.repls[0]
+        else:
+            self.pat = re.compile('|'.join('(' + pat.pattern + ')' for pat, _ in pats))
+            self.repl = lambda m: self.repls[m.lastindex - 1]
+        self.sub: Callable[[str], str] = partial(self.pat.sub, self.repl)
+
+
+RULE = Union[tuple[re.Pattern, str], CharRule, SuffixRule, FusedRule]
+
+
+def _compose(table1: dict, table2: dict) -> dict:
+    """先执行table1再执行table2的等价translate表"""
+    table = {c: chr(c).translate(table1).translate(table2) for c in table1.keys() | table2.keys()}
+    return {c: repl for c, repl in table.items() if repl != chr(c)}
+
+
+def _translate(table: dict) -> Callable[[str], str]:
+    """
+    str.translate逐字符查表较慢，改为用字符集正则删除字符，再替换其余字符。
+    两组字符不重叠，且替换结果不再参与删除，因此与translate结果一致。
+    """
+    removed = ''.join(re.escape(chr(c)) for c, repl in table.items() if not repl)
+    replaced = {chr(c): repl for c, repl in table.items() if repl}
+    pat_removed = re.compile('[' + removed + ']') if removed else None
+    pat_replaced = re.compile('[' + ''.join(map(re.escape, replaced)) + ']') if replaced else None
+
+    def translate(text: str) -> str:
+        if pat_removed is not None:
+            text = pat_removed.sub('', text)
+        if pat_replaced is not None:
+            text = pat_replaced.sub(lambda m: replaced[m[0]], text)
+        return text
+    return translate
+
+
+def _stripSuffix(chars: list[str]) -> Callable[[str], str]:
+    def strip(text: str) -> str:
+        for char in chars:
+            if text.endswith(char):
+                text = text[:-len(char)]
+        return text
+    return strip
+
+
+class RuleSet:
+    """
+    按顺序执行的清理规则列表，创建后不可修改，可以在多个CleaningProfile和线程之间共享。
+    需要增加规则时用list(ruleset)取出规则，再创建新的RuleSet。
+    编译时相邻的CharRule合并为一个字符表，相邻的SuffixRule合并为一次检查，执行结果与逐条执行一致。
+    name用于计时统计中区分各个规则列表。
+    """
+    def __init__(self, rules: list[RULE] = (), name: str = ''):
+        self.rules: tuple[RULE, ...] = tuple(rules)
+        self.name = name
+        self.stages: tuple[Callable[[str], str], ...] = ()
+        self.labels: tuple[str, ...] = ()  # 每个stage在计时统计中的名称
+        self._compile()
+
+    def _compile(self):
+        stages = []
+        labels = []
+        table = None
+        suffixes = None
+        for rule in (*self.rules, None):
+            if table is not None and not isinstance(rule, CharRule):
+                stages.append(_translate(table))
+                labels.append('chars ' + ''.join(chr(c) for c in table))
+                table = None
+            if suffixes is not None and not isinstance(rule, SuffixRule):
+                stages.append(_stripSuffix(suffixes))
+                labels.append('suffix ' + ''.join(suffixes))
+                suffixes = None
+
+            if rule is None:
+                break
+            elif isinstance(rule, CharRule):
+                table = rule.table if table is None else _compose(table, rule.table)
+            elif isinstance(rule, SuffixRule):
+                suffixes = (suffixes or []) + [rule.char]
+            elif isinstance(rule, FusedRule):
+                stages.append(rule.sub)
+                labels.append(rule.pat.pattern)
+            else:
+                pat, repl = rule
+                stages.append(partial(pat.sub, repl))
+                labels.append(pat.pattern)
+        self.stages = tuple(stages)
+        self.labels = tuple(f'{self.name}[{i}] {label}' for i, label in enumerate(labels))
+
+    def apply(self, text: str, profile: Optional[Profile] = None) -> str:
+        """profile: 传入时对每条规则计时"""
+        if profile is not None:
+            return self._applyProfiled(text, profile)
+        for stage in self.stages:
+            text = stage(text)
+        return text
+
+    def _applyProfiled(self, text: str, profile: Profile) -> str:
+        for stage, label in zip(self.stages, self.labels):
+            t0 = perf_counter()
+            text = stage(text)
+            profile.addPattern(label, perf_counter() - t0)
+        return text
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
@@ -0,0 +1,127 @@
+import re
+from typing import NamedTuple
+
+from utils.mergetype import MergeType
+from utils.mydialogue import plain_text
+from utils.profiler import getProfile, pattern
+from utils.rules import RuleSet
+
+
+class Segment(NamedTuple):
+    """合并中的一段文本（一行对白）"""
+    text: str
+    mergetype: MergeType
+    """与上一段之间的合并方式，第一段的无意义"""
+
+
+def _removeAcross(segments: list[Segment], pat: re.Pattern) -> list[Segment]:
+    """
+    在所有段连起来的文本上删除pat的匹配，可以跨越段的边界，如`(a` `b)c`。
+    被匹配完全包含的边界随之消失，前后两段合并为一段，合并方式取前一段的。
+    """
+    full = ''.join(segment.text for segment in segments)
+    spans = [m.span() for m in pat.finditer(full)]
+    if not spans:
+        return segments
+
+    result: list[Segment] = []
+    si = 0  # 第一个在当前段开始之后结束的匹配
+    lo = 0
+    for k, segment in enumerate(segments):
+        hi = lo + len(segment.text)
+        while si < len(spans) and spans[si][1] <= lo:
+            si += 1
+        # 当前段开头的边界是否在某个匹配内部
+        inside = k > 0 and si < len(spans) and spans[si][0] < lo
+
+        parts = []
+        p = lo
+        j = si
+        while j < len(spans) and spans[j][0] < hi:
+            a, b = spans[j]
+            if a > p:
+                parts.append(full[p:a])
+            p = max(p, b)
+            j += 1
+        if p < hi:
+            parts.append(full[p:hi])
+        text = ''.join(parts)
+
+        if inside:
+            result[-1] = Segment(result[-1].text + text, result[-1].mergetype)
+        else:
+            result.append(Segment(text, segment.mergetype))
+        lo = hi
+    return result
+
+
+def _stripAcross(segments: list[Segment], chars: str) -> list[Segment]:
+    """
+    删除所有段连起来的文本两端的chars，两端的空段及其边界一并删除。
+    按时间合并的边界相当于一个不会被删除的分隔符，删除到此为止。
+    """
+    segments = list(segments)
+    while True:
+        first = segments[0]
+        text = first.text.lstrip(chars)
+        if text or len(segments) == 1 or segments[1].mergetype == MergeType.Time:
+            segments[0] = Segment(text, first.mergetype)
+            break
+        segments[0:2] = [Segment(segments[1].text, first.mergetype)]
+    while True:
+        last = segments[-1]
+        text = last.text.rstrip(chars)
+        if text or len(segments) == 1 or last.mergetype == MergeType.Time:
+            segments[-1] = Segment(text, last.mergetype)
+            break
+        segments.pop()
+    return segments
+
+
+def cleanAcross(segments: list[Segment], pats: RuleSet, strip_chars: str) -> list[Segment]:
+    """
+    依次执行pats中的删除规则（可以跨越段的边界），再删除两端的strip_chars，
+    与把各段用分隔符连起来执行pats、strip后再拆开的结果一致。
+    开启计时时与RuleSet.apply一样按pats.labels统计每条规则的耗时。
+    """
+    if len(segments) == 1:
+        # 没有合并（最常见的情况）时与单行清理相同
+        segment = segments[0]
+        return [Segment(pats.apply(segment.text, getProfile()).strip(strip_chars), segment.mergetype)]
+    # 只有正则规则时每条规则对应一个stage，labels与规则一一对应
+    for rule, label in zip(pats, pats.labels):
+        assert isinstance(rule, tuple) and rule[1] == '', '跨行清理只支持删除匹配内容的正则规则！'
+        with pattern(label):
+            segments = _removeAcross(segments, rule[0])
+    return _stripAcross(segments, strip_chars)
+
+
+def joinSegments(
+    segments: list[Segment],
+    pairs: dict[str, str],
+    sep: str,
+    sep_on_overlap: str,
+    special_prefix: str,
+    sep_on_special_prefix: str,
+) -> str:
+    """
+    用分隔符连接各段，跳过空段。左括号后、右括号前不加分隔符，即`[text]`而不是`[ text ]`。
+    只比较上一个非空段的结尾，pairs中的符号应为单个字符。
+    """
+    parts = [segments[0].text]
+    tail = segments[0].text
+    for segment in segments[1:]:
+        text = segment.text
+        if not text:
+            continue
+        if any(tail.endswith(left) or text.startswith(right) for left, right in pairs.items()):
+            parts.append('')
+        elif special_prefix and plain_text(text).startswith(special_prefix):
+            parts.append(sep_on_special_prefix)
+        elif segment.mergetype == MergeType.Time:
+            parts.append(sep_on_overlap)
+        else:
+            parts.append(sep)
+        parts.append(text)
+        tail = text
+    return ''.join(parts)
@@ -0,0 +1,230 @@
+from typing import IO, Iterable, Iterator, NamedTuple, Optional
+
+import ass
+from ass.section import EventsSection
+
+from utils.logfile import warning
+from utils.mydialogue import DIALOGUE, MyDialogue, parseDoc
+from utils.timeline import toMs
+
+
+class EventTime(NamedTuple):
+    """输出事件的时间，流式处理时代替完整的事件用于标注时间重叠"""
+    start: int  # ms
+    end: int  # ms
+
+
+def _isSectionHeader(line: str) -> bool:
+    return line.startswith('[') and line.endswith(']')
+
+
+class AssStreamReader:
+    """
+    逐行读取ass文件，[Events]之前的部分解析为ass.Document，事件逐个解析返回，不保存在内存中。
+    [Events]之后的其他段在事件读取完后解析到tail中。
+    """
+    def __init__(self, f: IO[str]):
+        self.f = f
+        header = []
+        for line in f:
+            if line.strip().lower() == '[' + ass.Document.EVENTS_HEADER.lower() + ']':
+                break
+            header.append(line)
+        # 没有[Events]段时ass.Document.parse_file会在最后补上一个空的
+        self.doc = parseDoc(header)
+        self.section: EventsSection = self.doc.events
+        self.tail = ass.Document()
+        self.tail.sections.clear()
+
+    def rawEvents(self) -> Iterator[tuple[str, str]]:
+        """
+        :returns: type name and unparsed fields of each event, e.g. ('Dialogue', '0,0:00:01.00,...')
+        """
+        section = self.section
+        for line in self.f:
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+            if _isSectionHeader(line):
+                self._readTail(line)
+                return
+            if ':' not in line:
+                # illformed, ignore
+                continue
+            type_name, _, line = line.partition(':')
+            line = line.lstrip()
+            if type_name.lower() == section.FORMAT_TYPE.lower():
+                section.add_line(type_name, line)
+                continue
+            if type_name.lower() not in section.line_parsers:
+                raise ValueError('unexpected {} line in {}'.format(type_name, section.name))
+            yield type_name, line
+
+    def parse(self, type_name: str, line: str) -> DIALOGUE:
+        section = self.section
+        return section.line_parsers[type_name.lower()].parse(type_name, line, section.field_order)
+
+    def events(self) -> Iterator[DIALOGUE]:
+        for type_name, line in self.rawEvents():
+            yield self.parse(type_name, line)
+
+    def _readTail(self, header: str):
+        lines = [header] + list(self.f)
+        self.tail = ass.Document.parse_file(lines)
+        # parse_file会补上默认段，这里只保留文件中实际存在的段
+        sections = [line.strip()[1:-1] for line in lines if _isSectionHeader(line.strip())]
+        for name in list(self.tail.sections):
+            if name not in sections:
+                del self.tail.sections[name]
+
+
+class AssStreamWriter:
+    """与ass.Document.dump_file格式一致，逐个写入事件"""
+    def __init__(self, f: IO[str], doc: ass.Document):
+        self.f = f
+        self.field_order = doc.events.field_order
+        first = True
+        for section in doc.sections.values():
+            if not first:
+                f.write('\n')
+            first = False
+            if isinstance(section, EventsSection):
+                f.write('[' + section.name + ']\n')
+                f.write('{}: {}\n'.format(section.FORMAT_TYPE, ', '.join(self.field_order)))
+                break
+            for line in section.dump():
+                f.write(line)
+                f.write('\n')
+
+    def write(self, event: DIALOGUE):
+        self.f.write(event.dump_with_type(self.field_order))
+        self.f.write('\n')
+
+    def writeRaw(self, line: str):
+        self.f.write(line)
+
+    def close(self, tail: ass.Document):
+        for section in tail.sections.values():
+            self.f.write('\n')
+            for line in section.dump():
+                self.f.write(line)
+                self.f.write('\n')
+
+
+class MergeBoundary:
+    """
+    按顺序逐个读入事件，判断能否在下一个事件之前切分，使切分点前后单独合并的结果与整体合并一致。
+    只在以下条件都满足的位置切分（保守判断）：
+    所有左括号都已在之后的行中出现对应的右括号，上一行不以合并后缀结尾，
+    与上一个可切分位置之后的所有行的时间范围不重叠（merge_time开启时，按时间合并时与已合并的任意一行重叠即继续合并）。
+    """
+    def __init__(self,
+                 pairs: dict[str, str],
+                 singlesufs: Iterable[str],
+                 merge_time: bool,
+                 last_rights: Optional[dict[str, int]] = None):
+        """
+        last_rights: 已知全部事件时，每个右括号最后出现的事件序号（不出现则不包含）。
+            之后不再出现对应右括号的左括号不会合并（processEvents只输出warning），不再阻止切分
+        """
+        self.pairs = pairs
+        self.singlesufs = tuple(singlesufs)
+        self.merge_time = merge_time
+        self.last_rights = last_rights
+        self.count = 0  # 已读入的事件数
+        self.pending: set[str] = set()  # 尚未出现的右括号
+        self.only_pending = False  # 上次check不能切分只是因为pending不为空
+        self.suffixed = False  # 上一行以合并后缀结尾
+        self.hull_start = self.hull_end = 0  # 上一个可切分位置之后所有行的时间范围
+
+    def check(self, start: int, end: int) -> bool:
+        """
+        start, end: time of the next event, in ms
+        :returns: whether it is safe to split before the next event
+        """
+        overlap = self.merge_time and self.hull_end > start and end > self.hull_start
+        safe = not self.pending and not self.suffixed and not overlap
+        self.only_pending = not safe and not self.suffixed and not overlap
+        if safe:
+            self.hull_start, self.hull_end = start, end
+        else:
+            self.hull_start, self.hull_end = min(self.hull_start, start), max(self.hull_end, end)
+        return safe
+
+    def force(self, start: int, end: int):
+        """在不安全的位置强制切分后，之前未配对的括号不再考虑"""
+        self.pending.clear()
+        self.hull_start, self.hull_end = start, end
+
+    def add(self, text: str, plain: Optional[str]):
+        """
+        读入check之后的事件
+        plain: plain text of a Dialogue, None for other events
+        """
+        pending = self.pending
+        if pending:
+            pending.difference_update([right for right in pending if right in text])
+        # 接续的合并会经过以后缀结尾的Comment等事件
+        self.suffixed = text.endswith(self.singlesufs)
+        if plain is not None:
+            last_rights = self.last_rights
+            for left, right in self.pairs.items():
+                if left in plain and right not in text:
+                    if last_rights is None or last_rights.get(right, -1) > self.count:
+                        pending.add(right)
+            self.suffixed = self.suffixed or plain.endswith(self.singlesufs)
+        self.count += 1
+
+
+def splitChunks(events: Iterable[DIALOGUE],
+                pairs: dict[str, str],
+                singlesufs: list[str],
+                merge_time: bool,
+                min_size: int,
+                window: int) -> Iterator[list[DIALOGUE]]:
+    """
+    把事件流切分为互不影响的若干段，每段至少min_size个事件，切分位置见MergeBoundary。
+    段长度达到window时强制切分，此时跨越切分点的合并不会进行。
+    只因为括号还没有配对而强制切分时，多半是未配对的括号（本来就不会合并），
+    之后确实出现对应的右括号时才输出warning。
+    """
+    chunk: list[DIALOGUE] = []
+    boundary = MergeBoundary(pairs, singlesufs, merge_time)
+    warned = False
+    forced: set[str] = set()  # 强制切分时还没有出现的右括号
+
+    def warnBroken():
+        nonlocal warned
+        if not warned:
+            warning('存在超过', window, '行的合并，已强制分段处理，跨越分段的合并不会进行！')
+            warned = True
+
+    for event in events:
+        start, end = toMs(event.start), toMs(event.end)
+        safe = boundary.check(start, end)
+        if chunk and len(chunk) >= min_size and (safe or len(chunk) >= window):
+            if not safe:
+                if boundary.only_pending:
+                    forced.update(boundary.pending)
+                else:
+                    warnBroken()
+                boundary.force(start, end)
+            yield chunk
+            chunk = []
+
+        if forced:
+            text = event.text
+            if any(right in text for right in forced):
+                warnBroken()
+                forced.clear()
+
+        if event.TYPE == 'Dialogue':
+            if not isinstance(event, MyDialogue):
+                event = MyDialogue(event)
+            boundary.add(event.text, event.plain_text)
+        else:
+            boundary.add(event.text, None)
+        chunk.append(event)
+
+    if chunk:
+        yield chunk
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from typing import Union
+
+from ass.data import _Field
+
+from utils.const import MS
+
+TIME = Union[int, timedelta]
+
+
+def toMs(t: TIME) -> int:
+    """ass的timedelta转为整数毫秒，已经是毫秒时原样返回"""
+    return t if type(t) is int else t // MS
+
+
+def fromMs(ms: int) -> timedelta:
+    return timedelta(milliseconds=ms)
+
+
+def formatMs(ms: int) -> str:
+    """日志中的时间格式 HH:MM:SS.mmm"""
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f'{h % 24:02}:{m:02}:{s:02}.{ms:03}'
+
+
+def parseAssTime(value: str) -> int:
+    """ass文件中的时间 H:MM:SS.cc 转为整数毫秒，与toMs(_Field.timedelta_from_ass(value))一致，省去timedelta"""
+    secs, _, csecs = value.partition('.')
+    h, m, s = map(int, secs.split(':'))
+    return (h * 3600 + m * 60 + s) * 1000 + int(csecs) * 10
+
+
+def formatAssTime(ms: int) -> str:
+    """ass文件中的时间格式 H:MM:SS.cc，与ass库对timedelta的输出一致"""
+    if ms < 0:
+        # 负数时ass库的输出比较特殊，直接交给它处理
+        return _Field.timedelta_to_ass(fromMs(ms))
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f'{h}:{m:02}:{s:02}.{ms // 10:02}'
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+
+class FileState(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+def _state(path: Path) -> Optional[FileState]:
+    try:
+        st = path.stat()
+    except OSError:
+        # 轮询之间被删除或改名
+        return None
+    return FileState(st.st_size, st.st_mtime_ns)
+
+
+class FolderWatcher:
+    """
+    轮询文件夹中新出现或被修改的*.ass文件（跳过已清理的输出）。
+    录制软件会持续写入文件，大小和修改时间在两次轮询之间都没有变化时才认为写入完成。
+    """
+    def __init__(self, folders: list[Path], done: Callable[[Path], bool]):
+        """
+        done: 判断文件是否已经处理过（如输出文件比输入文件新），启动时已处理过的文件不再处理
+        """
+        self.folders = folders
+        self.done = done
+        self.pending: dict[Path, FileState] = {}
+        self.seen: dict[Path, FileState] = {}
+        self.retry: set[Path] = set()  # 处理期间被修改，写入完成后不经done判断直接处理
+
+    def _scan(self) -> dict[Path, FileState]:
+        files = {}
+        for folder in self.folders:
+            for p in folder.glob('*.ass'):
+                if p.stem.endswith('_cleaned'):
+                    continue
+                state = _state(p)
+                if state is not None:
+                    files[p.resolve()] = state
+        return files
+
+    def poll(self) -> list[Path]:
+        """
+        :returns: files that finished writing since the last poll, in order of name
+        """
+        ready = []
+        pending = {}
+        files = self._scan()
+        # 删除的文件不再记录，之后出现同名文件时重新处理
+        self.seen = {p: state for p, state in self.seen.items() if p in files}
+        for p, state in sorted(files.items()):
+            if self.seen.get(p) == state:
+                continue
+            if self.pending.get(p) != state or state.size == 0:
+                pending[p] = state
+                continue
+            self.seen[p] = state
+            if p in self.retry or not self.done(p):
+                self.retry.discard(p)
+                ready.append(p)
+        self.pending = pending
+        return ready
+
+    def state(self, path: Path) -> Optional[FileState]:
+        """poll返回path时记录的状态"""
+        return self.seen.get(path)
+
+    def recheck(self, path: Path, state: Optional[FileState]):
+        """
+        path处理完成后调用，state为开始处理时的状态（见state）。
+        处理期间文件又被修改时，输出会比输入新，done会认为已经处理过，因此之后写入完成时强制重新处理
+        """
+        if _state(path) != state:
+            self.seen.pop(path, None)
+            self.retry.add(path)